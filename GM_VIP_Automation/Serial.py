@@ -1,16 +1,78 @@
 import argparse
+import csv
+import gzip
+import heapq
 import os
+import queue
+import re
+import shutil
+import sys
 import threading
 import time
+from datetime import datetime
 from pathlib import Path
 
 import serial
 import serial.tools.list_ports
 
+try:
+    import zstandard
+except ImportError:  # optional: only needed for --compress zstd
+    zstandard = None
+
 script_dir = Path(__file__).resolve().parent
 log_dir = script_dir
 
 
+class STXETXReassembler:
+    """
+    Incremental, byte-level version of reconstruct_from_STX_ETX().
+    Works directly on bytes/bytearray/memoryview as read from the port: frame
+    markers are located with a compiled regex, the bytes between two markers
+    are appended to the innermost open message in one slice, and only
+    completed messages are decoded. Parser state (the stack of interrupted
+    messages) is kept between calls, so feed() only processes new data.
+    """
+    STX = 0x02
+    ETX = 0x03
+    _MARKER = re.compile(b'[\x02\x03]')
+
+    def __init__(self, encoding='utf-8', errors='ignore'):
+        self.encoding = encoding
+        self.errors = errors
+        self._stack = []        # bytearray per open message, innermost last
+        self._started = False   # leading ETX bytes are dropped silently
+
+    def feed(self, data) -> list:
+        """Processes newly received bytes; returns the list of messages they complete."""
+        completed = []
+        stack = self._stack
+        view = memoryview(data)
+        pos, end = 0, len(view)
+        if not self._started:
+            while pos < end and view[pos] == self.ETX:
+                pos += 1
+            if pos == end:
+                return completed
+            self._started = True
+
+        for marker in self._MARKER.finditer(view, pos):
+            start = marker.start()
+            if stack and start > pos:
+                stack[-1] += view[pos:start]
+            if view[start] == self.ETX:
+                if stack:
+                    completed.append(stack.pop().decode(self.encoding, self.errors))
+                else:
+                    print("Warning: ETX found without matching STX. Ignoring.")
+            else:
+                stack.append(bytearray())
+            pos = start + 1
+        if stack and pos < end:
+            stack[-1] += view[pos:]
+        return completed
+
+
 def reconstruct_from_STX_ETX(contents: str) -> str:
     """
     Reconstruct log messages that were interleaved by preemption.
@@ -18,37 +80,338 @@ def reconstruct_from_STX_ETX(contents: str) -> str:
     while already inside a message, the current (interrupted) message is
     pushed to the stack and resumed after the inner message completes.
 
-    If no STX/ETX framing is found, returns the original content unchanged.
+    Characters outside any STX/ETX frame are dropped.
     """
-    STX = '\x02'
-    ETX = '\x03'
+    if isinstance(contents, str):
+        contents = contents.encode('utf-8', 'surrogatepass')
+        return '\n'.join(STXETXReassembler(errors='surrogatepass').feed(contents))
+    return '\n'.join(STXETXReassembler().feed(contents))
 
-    class msg:
-        def __init__(self):
-            self.message = ""
-            self.parent = None
 
-    messages = []
-    current_msg = None
+class ConsoleEcho:
+    """
+    Rate-limited console echo: at most max_bytes are buffered and printed
+    once per interval, the overflow is only counted, so printing can never
+    throttle the caller.
+    """
 
-    contents = contents.lstrip(ETX)
+    def __init__(self, interval=0.5, max_bytes=4096):
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._buffer = bytearray()
+        self._suppressed = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, data: bytes):
+        room = max(0, self.max_bytes - len(self._buffer))
+        self._buffer += data[:room]
+        self._suppressed += max(0, len(data) - room)
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            sys.stdout.write(self._buffer.decode(errors='ignore'))
+            self._buffer.clear()
+        if self._suppressed:
+            sys.stdout.write(f"\n[... {self._suppressed} bytes not echoed]\n")
+            self._suppressed = 0
+        sys.stdout.flush()
+        self._last_flush = time.monotonic()
+
+
+class SerialReader:
+    """
+    Background UART reader built on blocking reads with a short timeout.
+    The thread waits in the driver until at least one byte arrives (no fixed
+    polling sleep), then takes everything already buffered and hands it to a
+    bounded queue. Console echo is optional and rate-limited so printing can
+    never throttle the reader. Byte, chunk and overrun counters are kept for
+    the end-of-run summary.
+    """
 
-    for char in contents:
-        if char == ETX:
-            if current_msg:
-                messages.append(current_msg.message)
-                current_msg = current_msg.parent
-            else:
-                print("Warning: ETX found without matching STX. Ignoring.")
-        elif char == STX:
-            new_msg = msg()
-            if current_msg:
-                new_msg.parent = current_msg
-            current_msg = new_msg
-        else:
-            if current_msg:
-                current_msg.message += char
-    return '\n'.join(messages)
+    def __init__(self, ser, queue_size=4096, echo=False, echo_interval=0.5, echo_max_bytes=4096, read_timeout=0.1):
+        self.ser = ser
+        self.ser.timeout = read_timeout
+        self.echo = ConsoleEcho(echo_interval, echo_max_bytes) if echo else None
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.bytes_read = 0
+        self.chunks_read = 0
+        self.chunks_dropped = 0   # queue overruns: the consumer fell a full queue behind
+        self.bytes_dropped = 0
+        self.max_in_waiting = 0   # high-water mark of the driver receive buffer
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"serial-reader-{ser.port}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        if self.echo:
+            self.echo.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Blocks until a byte arrives or the timeout expires, then takes the rest.
+                data = self.ser.read(1)
+                if not data:
+                    continue
+                # Arrival time on the process-wide monotonic clock shared by all ports
+                arrived = time.monotonic()
+                waiting = self.ser.in_waiting
+                self.max_in_waiting = max(self.max_in_waiting, waiting)
+                if waiting:
+                    data += self.ser.read(waiting)
+            except serial.SerialException as e:
+                print(f"Serial error on {self.ser.port}: {e}")
+                break
+            self.bytes_read += len(data)
+            self.chunks_read += 1
+            try:
+                self.chunks.put_nowait((arrived, data))
+            except queue.Full:
+                self.chunks_dropped += 1
+                self.bytes_dropped += len(data)
+            if self.echo:
+                self.echo.write(data)
+
+    def drain_timestamped(self) -> list:
+        """Returns all queued (monotonic arrival time, bytes) chunks (non-blocking)."""
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.chunks.get_nowait())
+            except queue.Empty:
+                return chunks
+
+    def drain(self) -> bytes:
+        """Returns all queued chunks joined into one bytes object (non-blocking)."""
+        return b''.join(data for _, data in self.drain_timestamped())
+
+    def stats(self) -> str:
+        return (f"{self.bytes_read} bytes in {self.chunks_read} reads, "
+                f"{self.chunks_dropped} chunks ({self.bytes_dropped} bytes) dropped on queue overrun, "
+                f"driver buffer high-water mark {self.max_in_waiting} bytes")
+
+
+class SegmentCompressor:
+    """
+    Compresses closed log segments on a background thread so rollover never
+    blocks the capture loop. One instance is shared by all sinks of a run;
+    close() waits for the queued segments to finish.
+    """
+    SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, method='gzip'):
+        if method == 'zstd' and zstandard is None:
+            print("zstandard is not installed; compressing segments with gzip instead.")
+            method = 'gzip'
+        self.method = method
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="segment-compressor", daemon=True)
+        self._thread.start()
+
+    def compressed_path(self, path: Path) -> Path:
+        return path.with_name(path.name + self.SUFFIXES[self.method])
+
+    def submit(self, path: Path):
+        self._queue.put(path)
+
+    def _run(self):
+        while (path := self._queue.get()) is not None:
+            target = self.compressed_path(path)
+            try:
+                with path.open('rb') as src:
+                    if self.method == 'zstd':
+                        with target.open('wb') as dst:
+                            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+                    else:
+                        with gzip.open(target, 'wb', compresslevel=6) as dst:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                path.unlink()
+            except OSError as e:
+                print(f"Warning: could not compress {path.name}: {e}")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class LogSink:
+    """
+    Append-only UTF-8 log whose active segment always lives at the given
+    path (teraterm.txt), so readers such as the CAPL tests keep finding it.
+    Once max_bytes or max_seconds is reached (0 disables either limit) the
+    active file is renamed to the next numbered segment (teraterm.001.txt,
+    teraterm.002.txt, ...), handed to an optional SegmentCompressor, and a
+    fresh teraterm.txt is started; fsync only ever touches the active
+    segment. <stem>.index.csv records each segment's file name, time range
+    and size, so post-processing can open just the window it needs; the
+    active segment's row is refreshed on every sync(), so the newest window
+    is indexed even if the process is killed. Segments and index left over
+    from a previous run are removed on open.
+    """
+    INDEX_FIELDS = ['segment', 'file', 'start_time', 'end_time', 'bytes']
+
+    def __init__(self, path, max_bytes=0, max_seconds=0, compressor=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compressor = compressor
+        self.segment = 1
+        self.index_path = self.path.with_name(f"{self.path.stem}.index.csv")
+        self._rows = []                 # index rows of the closed segments
+        self._roll_failed = False       # last rename failed; warn once, retry on every write
+        for stale in self.path.parent.glob(f"{self.path.stem}.[0-9][0-9][0-9]{self.path.suffix}*"):
+            stale.unlink()
+        self.path.with_name(self.path.name + '.gz').unlink(missing_ok=True)
+        self.path.with_name(self.path.name + '.zst').unlink(missing_ok=True)
+        self._open_segment()
+        self._write_index()
+
+    def _segment_path(self) -> Path:
+        return self.path.with_name(f"{self.path.stem}.{self.segment:03d}{self.path.suffix}")
+
+    def _open_segment(self):
+        self._file = self.path.open('wb')
+        self.size = 0
+        self.opened_at = time.monotonic()
+        self.first_time = None
+        self.last_time = None
+
+    def _index_row(self, path: Path) -> list:
+        start, end = (datetime.fromtimestamp(t).isoformat(timespec='milliseconds') if t else ''
+                      for t in (self.first_time, self.last_time))
+        return [self.segment, path.name, start, end, self.size]
+
+    def _write_index(self):
+        """Rewrites <stem>.index.csv: the closed segments plus the live one."""
+        rows = self._rows + [self._index_row(self.path)]
+        tmp = self.index_path.with_name(self.index_path.name + '.tmp')
+        try:
+            with tmp.open('w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(self.INDEX_FIELDS)
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            # e.g. the index is held open by a reader on Windows; the next sync() retries
+            print(f"Warning: could not update {self.index_path.name}: {e}")
+
+    def _roll(self):
+        """Moves the active file to the next numbered segment and starts a new one."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        path = self._segment_path()
+        try:
+            os.replace(self.path, path)
+        except OSError as e:
+            # e.g. a reader holds teraterm.txt open on Windows: keep appending, retry on the next write
+            if not self._roll_failed:
+                print(f"Warning: could not roll {self.path.name} over to {path.name}: {e}")
+            self._roll_failed = True
+            self._file = self.path.open('ab')
+            return
+        self._roll_failed = False
+        if self.compressor:
+            self.compressor.submit(path)
+            path = self.compressor.compressed_path(path)
+        self._rows.append(self._index_row(path))
+        self.segment += 1
+        self._open_segment()
+        self._write_index()
+
+    def _should_roll(self, incoming) -> bool:
+        if not self.size:
+            return False
+        if self.max_bytes and self.size + incoming > self.max_bytes:
+            return True
+        return bool(self.max_seconds) and time.monotonic() - self.opened_at >= self.max_seconds
+
+    def write(self, text: str, when=None):
+        """Appends text; 'when' is the wall-clock time (epoch seconds) of its content, default now."""
+        data = text.encode('utf-8', 'ignore')
+        if self._should_roll(len(data)):
+            self._roll()
+        when = time.time() if when is None else when
+        if self.first_time is None:
+            self.first_time = when
+        self.last_time = when
+        self._file.write(data)
+        self.size += len(data)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._write_index()
+
+    def close(self):
+        # The final segment stays uncompressed at the stable path so the latest data is directly readable
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._write_index()
+
+
+def open_serial_port(serial_port, baudrate=115200):
+    return serial.Serial(
+        port=serial_port,
+        baudrate=baudrate,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS,
+        timeout=1
+    )
+
+
+def parse_port_spec(spec: str):
+    """'A72=COM5' -> ('A72', 'COM5'); a bare 'COM5' or '/dev/ttyUSB0' is named after the device."""
+    name, sep, port = spec.partition('=')
+    if not sep:
+        port, name = spec, Path(spec).name
+    return name, port
+
+
+class PortCapture:
+    """
+    One console of a multi-port capture: reader thread, STX/ETX reassembly
+    and a per-port log. Every completed message is stamped with the arrival
+    time of the chunk that completed it, relative to the capture start t0.
+    """
+
+    def __init__(self, name, ser, sink):
+        self.name = name
+        self.ser = ser
+        self.reader = SerialReader(ser)
+        self.reassembler = STXETXReassembler()
+        self.sink = sink
+        self.messages = 0
+
+    def collect(self, t0, wall_t0) -> list:
+        """Logs newly completed messages and returns them as (elapsed, name, message)."""
+        entries = []
+        for arrived, data in self.reader.drain_timestamped():
+            for message in self.reassembler.feed(data):
+                entries.append((arrived - t0, self.name, message))
+        for elapsed, _, message in entries:
+            self.sink.write(format_stamped(elapsed, message), when=wall_t0 + elapsed)
+        if entries:
+            self.sink.sync()
+            self.messages += len(entries)
+        return entries
+
+
+def format_stamped(elapsed, message, name=None) -> str:
+    prefix = f"[{elapsed:12.6f}] " + (f"[{name}] " if name else "")
+    return ''.join(prefix + line + '\n' for line in message.splitlines() or [''])
 
 
 def is_port_available(port_name, baudrate=115200):
@@ -85,16 +448,9 @@ def user_select_port():
     return ports[int(port_index)].device
 
 
-def main(serial_port, baudrate=115200):
+def main(serial_port, baudrate=115200, echo=True, duration=20, rotate_mb=0, rotate_minutes=0, compress='gzip'):
     try:
-        ser = serial.Serial(
-            port=serial_port,
-            baudrate=baudrate,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            bytesize=serial.EIGHTBITS,
-            timeout=1
-        )
+        ser = open_serial_port(serial_port, baudrate)
 
         if ser.isOpen():
             print(f"Serial port {ser.port} opened successfully.")
@@ -103,68 +459,50 @@ def main(serial_port, baudrate=115200):
             return
 
         log_dir.mkdir(parents=True, exist_ok=True)
-        log_file_path = log_dir / "teraterm.txt"
-        log_file_temp_path = log_dir / "teraterm.tmp"
-        log_file_path.unlink(missing_ok=True)
-        log_file_temp_path.unlink(missing_ok=True)
+        compressor = SegmentCompressor(compress) if compress != 'none' else None
+        log_sink = LogSink(log_dir / "teraterm.txt", max_bytes=int(rotate_mb * 1024 * 1024),
+                           max_seconds=rotate_minutes * 60, compressor=compressor)
 
-        duration = 20  # seconds
         fsync_interval = 2.0
 
-        # Shared state between threads
-        raw_content = ""
-        content_lock = threading.Lock()
-        stop_reading = threading.Event()
-
-        def read_serial_thread():
-            """Background thread that continuously reads from serial port."""
-            nonlocal raw_content
-            while not stop_reading.is_set():
-                response = ser.read(ser.in_waiting)
-                if response:
-                    log_entry = response.decode(errors='ignore')
-                    print(log_entry, end='')
-                    with content_lock:
-                        raw_content += log_entry
-                time.sleep(0.05)  # Small sleep to prevent busy-waiting
+        reader = SerialReader(ser, echo=echo)
+        reassembler = STXETXReassembler()
+        messages_written = 0
+        stop_logging = threading.Event()
+
+        def flush_completed_messages():
+            """Parses newly received data and appends completed messages to the log."""
+            nonlocal messages_written
+            data = reader.drain()
+            if not data:
+                return
+            messages = reassembler.feed(data)
+            if messages:
+                # Same layout as reconstruct_from_STX_ETX(): messages separated by newlines.
+                separator = '\n' if messages_written else ''
+                log_sink.write(separator + '\n'.join(messages))
+                log_sink.sync()
+                messages_written += len(messages)
 
         print("Started logging UART data...")
         start = time.time()
-        last_fsync = start
-
-        # Start the serial reading thread
-        reader_thread = threading.Thread(target=read_serial_thread, daemon=True)
-        reader_thread.start()
-
-        # Main thread: periodically reconstruct and save
-        while (now := time.time()) - start < duration:
-            if now - last_fsync >= fsync_interval:
-                with content_lock:
-                    if raw_content:
-                        reconstructed_content = reconstruct_from_STX_ETX(raw_content)
-                        # Write to temp file, then atomically rename
-                        with log_file_temp_path.open('w', encoding='utf-8', errors='ignore') as temp_file:
-                            temp_file.write(reconstructed_content)
-                            temp_file.flush()
-                            os.fsync(temp_file.fileno())
-                        log_file_temp_path.replace(log_file_path) # Atomic rename
-                last_fsync = now
-
-            time.sleep(0.05)
-
-        # Signal the reader thread to stop
-        stop_reading.set()
-        reader_thread.join(timeout=2.0)
-
-        # Write any remaining data
-        with content_lock:
-            if raw_content:
-                reconstructed_content = reconstruct_from_STX_ETX(raw_content)
-                with log_file_temp_path.open('w', encoding='utf-8', errors='ignore') as temp_file:
-                    temp_file.write(reconstructed_content)
-                    temp_file.flush()
-                    os.fsync(temp_file.fileno())
-                log_file_temp_path.replace(log_file_path) # Atomic rename
+        reader.start()
+
+        try:
+            # Main thread: wake once per fsync interval and append newly completed messages
+            while (remaining := duration - (time.time() - start)) > 0:
+                stop_logging.wait(min(fsync_interval, remaining))
+                flush_completed_messages()
+
+            # Stop the reader thread and write any remaining data
+            reader.stop()
+            flush_completed_messages()
+        finally:
+            log_sink.close()
+            if compressor:
+                compressor.close()
+
+        print(f"\nUART capture finished: {reader.stats()}.")
 
     except serial.SerialException as e:
         print(f"Serial error: {e}")
@@ -176,12 +514,120 @@ def main(serial_port, baudrate=115200):
             print(f"Serial port {ser.port} closed.")
 
 
+# Merged-log entries are held back this long so a chunk stamped just before a
+# flush but still on its way through another port's queue is not written out of order.
+MERGE_LATENESS = 1.0
+
+
+def main_multi(port_specs, baudrate=115200, echo=True, duration=20, merged=False, rotate_mb=0, rotate_minutes=0,
+               compress='gzip'):
+    """
+    Captures several UART consoles at once (e.g. A72, MCU1_0, MCU2_0, MCU2_1)
+    into uart_<name>.log files. Each line is prefixed with seconds since the
+    capture start on one monotonic clock shared by all ports, so cross-core
+    timing can be correlated. With merged=True a time-ordered uart_merged.log
+    is written as well.
+    """
+    compressor = SegmentCompressor(compress) if compress != 'none' else None
+
+    def make_sink(filename):
+        return LogSink(log_dir / filename, max_bytes=int(rotate_mb * 1024 * 1024),
+                       max_seconds=rotate_minutes * 60, compressor=compressor)
+
+    flush_interval = 2.0
+    # One rate-limited echo for all ports, fed from the main thread
+    console = ConsoleEcho() if echo else None
+    captures = []
+    merged_sink = None
+    pending = []  # heap of (elapsed, port index, sequence, name, message) for the merged log
+    sequence = 0
+
+    def collect_all(t0, wall_t0, watermark):
+        nonlocal sequence
+        for index, capture in enumerate(captures):
+            for elapsed, name, message in capture.collect(t0, wall_t0):
+                if console:
+                    console.write(format_stamped(elapsed, message, name).encode('utf-8', 'ignore'))
+                if merged_sink:
+                    heapq.heappush(pending, (elapsed, index, sequence, name, message))
+                    sequence += 1
+        if merged_sink:
+            written = False
+            while pending and pending[0][0] < watermark:
+                elapsed, _, _, name, message = heapq.heappop(pending)
+                merged_sink.write(format_stamped(elapsed, message, name), when=wall_t0 + elapsed)
+                written = True
+            if written:
+                merged_sink.sync()
+
+    try:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        for spec in port_specs:
+            name, port = parse_port_spec(spec)
+            ser = open_serial_port(port, baudrate)
+            print(f"Serial port {ser.port} opened successfully as {name}.")
+            captures.append(PortCapture(name, ser, make_sink(f"uart_{name}.log")))
+        if merged:
+            merged_sink = make_sink("uart_merged.log")
+
+        print(f"Started logging UART data from {len(captures)} ports...")
+        stop_logging = threading.Event()
+        t0 = time.monotonic()
+        wall_t0 = time.time()
+        for capture in captures:
+            capture.reader.start()
+
+        while (remaining := duration - (time.monotonic() - t0)) > 0:
+            stop_logging.wait(min(flush_interval, remaining))
+            collect_all(t0, wall_t0, time.monotonic() - t0 - MERGE_LATENESS)
+
+        for capture in captures:
+            capture.reader.stop()
+        collect_all(t0, wall_t0, float('inf'))
+        if console:
+            console.flush()
+
+        for capture in captures:
+            print(f"{capture.name}: {capture.messages} messages, {capture.reader.stats()}.")
+
+    except serial.SerialException as e:
+        print(f"Serial error: {e}")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+    finally:
+        for capture in captures:
+            capture.reader.stop()
+            capture.sink.close()
+            if capture.ser.isOpen():
+                capture.ser.close()
+                print(f"Serial port {capture.ser.port} closed.")
+        if merged_sink:
+            merged_sink.close()
+        if compressor:
+            compressor.close()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Serial Port Logger")
     # parser.add_argument('--port', type=str, default=None, help='Serial port for UART communication')
     parser.add_argument('--baudrate', type=int, default=115200, help='Baud rate for serial communication')
+    parser.add_argument('--no-echo', dest='echo', action='store_false', help='Do not echo received UART data to the console')
+    parser.add_argument('--ports', nargs='+', metavar='[NAME=]PORT', default=None,
+                        help='Capture several ports concurrently, e.g. A72=COM5 MCU1_0=COM6 (writes uart_<NAME>.log)')
+    parser.add_argument('--merged', action='store_true', help='With --ports, also write a time-ordered uart_merged.log')
+    parser.add_argument('--duration', type=float, default=20, help='Capture duration in seconds')
+    parser.add_argument('--rotate_mb', type=float, default=0, help='Roll log files over to a new segment after this many MB (0 = never)')
+    parser.add_argument('--rotate_minutes', type=float, default=0, help='Roll log files over to a new segment after this many minutes (0 = never)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd', 'none'], default='gzip',
+                        help='Compression for closed log segments (zstd needs the zstandard package)')
     args = parser.parse_args()
 
-    # port = args.port if args.port else user_select_port()
-    port = auto_select_usb_serial_port(baudrate=args.baudrate)
-    main(serial_port=port, baudrate=args.baudrate)
+    if args.ports:
+        main_multi(args.ports, baudrate=args.baudrate, echo=args.echo, duration=args.duration,
+                   merged=args.merged, rotate_mb=args.rotate_mb, rotate_minutes=args.rotate_minutes,
+                   compress=args.compress)
+    else:
+        # port = args.port if args.port else user_select_port()
+        port = auto_select_usb_serial_port(baudrate=args.baudrate)
+        main(serial_port=port, baudrate=args.baudrate, echo=args.echo, duration=args.duration,
+             rotate_mb=args.rotate_mb, rotate_minutes=args.rotate_minutes, compress=args.compress)
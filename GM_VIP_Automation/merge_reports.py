@@ -9,7 +9,10 @@ Report sources discovered automatically
 ----------------------------------------
 1. CANoe per-module XML reports stored under  ``Test Reports/**/*.xml``
    (written by the test suite at the paths declared in the .tse files,
-   e.g. Test Reports/Sanity/Sanity_report.xml).
+   e.g. Test Reports/Sanity/Sanity_report.xml), plus JUnit XMLs found
+   there such as the CAPL validation results written by
+   ``validate_capl.py --junit``.  ``junit/`` sub-folders are skipped: they
+   only mirror CANoe-format reports for the Jenkins junit() step.
 2. Trace32 summary report at  ``Trace32/report.xml``  (optional – only
    included when the file exists).
 3. Any additional  ``report.xml``  files found immediately inside the
@@ -33,6 +36,9 @@ The script handles two common CANoe export formats:
   • ``testmodule``  root element  (newer format with ``<testgroup>``
     containers that hold ``<testcase>`` children)
 
+JUnit ``testsuite`` / ``testsuites`` roots are read as well (a testcase
+fails when it has a ``<failure>`` or ``<error>`` child).
+
 T32 / Trace32 report format
 -----------------------------
 Any ``<testcase>`` or ``<step>`` elements found in Trace32 XML reports are
@@ -244,6 +250,42 @@ def _parse_t32_report(root: ET.Element) -> List[TestGroup]:
     return [group] if group.cases else []
 
 
+def _parse_junit(root: ET.Element) -> List[TestGroup]:
+    """
+    Parse a JUnit ``<testsuite>`` / ``<testsuites>`` root (e.g. the
+    validate_capl.py --junit output): one group per testsuite, a testcase
+    fails when it has a <failure> or <error> child, and each line of the
+    failure text becomes a step so the individual findings are listed.
+    """
+    groups: List[TestGroup] = []
+    suites = [root] if root.tag.lower() == "testsuite" else root.iter("testsuite")
+    for suite_elem in suites:
+        group = TestGroup(title=suite_elem.get("name", "Test suite"))
+        for tc_elem in suite_elem.findall("testcase"):
+            name      = tc_elem.get("name", "unnamed")
+            classname = tc_elem.get("classname", "")
+            problem   = tc_elem.find("failure")
+            if problem is None:
+                problem = tc_elem.find("error")
+
+            steps: List[TestStep] = []
+            if problem is not None:
+                res = "fail"
+                for line in (problem.text or problem.get("message", "")).splitlines():
+                    if line.strip():
+                        steps.append(TestStep(name=problem.get("type", ""), result="fail",
+                                              description=line.strip()))
+            elif tc_elem.find("skipped") is not None:
+                res = "skipped"
+            else:
+                res = "pass"
+            title = f"{classname}/{name}" if classname else name
+            group.cases.append(TestCase(name=name, title=title, result=res, steps=steps))
+        if group.cases:
+            groups.append(group)
+    return groups
+
+
 def parse_report_xml(filepath: Path, is_t32: bool = False) -> Optional[ReportModule]:
     """Parse one XML file into a ReportModule.  Returns None on error."""
     try:
@@ -264,6 +306,9 @@ def parse_report_xml(filepath: Path, is_t32: bool = False) -> Optional[ReportMod
     elif tag in ("testmodule", "testmoduleresults"):
         groups = _parse_canoe_testmodule(root)
         title  = root.get("title", filepath.stem)
+    elif tag in ("testsuite", "testsuites"):
+        groups = _parse_junit(root)
+        title  = root.get("name", filepath.stem)
     else:
         # Unknown schema – try both parsers and take whichever yields data.
         groups = _parse_canoe_testmodule(root) or _parse_canoe_testresults(root)
@@ -308,11 +353,12 @@ def discover_reports(root: Path, xml_dir: Optional[Path] = None) -> List[ReportM
                 modules.append(mod)
         return modules
 
-    # 1. CANoe per-module reports
+    # 1. CANoe per-module reports (and JUnit results such as the CAPL
+    #    validation report; junit/ folders only mirror CANoe-format reports)
     test_reports_dir = root / "Test Reports"
     if test_reports_dir.is_dir():
         for xml_path in sorted(test_reports_dir.rglob("*.xml")):
-            if xml_path.resolve() in seen:
+            if xml_path.resolve() in seen or "junit" in xml_path.relative_to(test_reports_dir).parts[:-1]:
                 continue
             seen.add(xml_path.resolve())
             mod = parse_report_xml(xml_path)
@@ -10,6 +10,8 @@ What it does
 1. Scans every .can file under GM_VIP_Automation for testcase definitions.
 2. Reads every Testsuite_Environment/*.xml file for <capltestcase> references
    grouped by suite and test group.
+   Both come from the shared workspace index (workspace_index.py), so only
+   files changed since the last run are re-read.
 3. For each suite XML it writes two report files into the output directory:
 
    <suite_name>_simulated.xml  –  CANoe testmodule schema consumed by
@@ -34,7 +36,7 @@ Exit codes
 Usage
 -----
     python simulate_tests.py [--root <GM_VIP_Automation folder>]
-                             [--out-dir <output directory>]
+                             [--out-dir <output directory>] [--jobs N]
 """
 
 from __future__ import annotations
@@ -42,53 +44,29 @@ from __future__ import annotations
 import argparse
 import datetime
 import os
-import re
 import sys
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import XMLGenerator, escape
+
+from workspace_index import SuiteFileInfo, WorkspaceIndex
 
 
 # ---------------------------------------------------------------------------
 # CAPL testcase discovery
 # ---------------------------------------------------------------------------
 
-_TESTCASE_DEF_RE = re.compile(
-    r'(?:export\s+)?testcase\s+(\w+)\s*\('
-)
-_BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
-_LINE_COMMENT_RE  = re.compile(r'//[^\n]*')
-
-
-def _strip_comments(text: str) -> str:
-    """Remove CAPL block and line comments, preserving line count."""
-    text = _BLOCK_COMMENT_RE.sub(
-        lambda m: '\n' * m.group(0).count('\n'), text
-    )
-    text = _LINE_COMMENT_RE.sub('', text)
-    return text
-
-
-def discover_testcases(root: Path) -> Dict[str, Path]:
+def discover_testcases(root: Path, index: Optional[WorkspaceIndex] = None) -> Dict[str, Path]:
     """
     Return {testcase_name: can_filepath} for all testcase definitions found
     in .can files under *root*.  The first definition wins when duplicates
     exist (same name in multiple files is a configuration error but we handle
-    it gracefully).
+    it gracefully).  Definitions come from the shared workspace index, so
+    unchanged .can files are not re-read.
     """
-    defined: Dict[str, Path] = {}
-    for dirpath, _, filenames in os.walk(root):
-        for fn in filenames:
-            if fn.lower().endswith('.can'):
-                fp = Path(dirpath) / fn
-                try:
-                    raw = fp.read_text(encoding='latin-1', errors='replace')
-                except OSError:
-                    continue
-                cleaned = _strip_comments(raw)
-                for m in _TESTCASE_DEF_RE.finditer(cleaned):
-                    defined.setdefault(m.group(1), fp)
-    return defined
+    index = index or WorkspaceIndex.load(root)
+    return index.testcase_definitions(extensions=('.can',), first_wins=True)
 
 
 # ---------------------------------------------------------------------------
@@ -97,19 +75,22 @@ def discover_testcases(root: Path) -> Dict[str, Path]:
 
 def discover_suites(
     testsuite_dir: Path,
-) -> List[Tuple[str, ET.ElementTree, Path]]:
+    index: Optional[WorkspaceIndex] = None,
+) -> List[Tuple[str, SuiteFileInfo, Path]]:
     """
-    Return [(suite_name, parsed_tree, filepath), …] for every XML file in
-    *testsuite_dir* that can be parsed.
+    Return [(suite_name, suite_info, filepath), …] for every XML file directly
+    in *testsuite_dir* that can be parsed.
     """
-    suites: List[Tuple[str, ET.ElementTree, Path]] = []
-    for fp in sorted(testsuite_dir.glob('*.xml')):
-        try:
-            tree = ET.parse(fp)
-        except ET.ParseError as exc:
-            print(f"  WARNING: could not parse {fp}: {exc}", file=sys.stderr)
+    index = index or WorkspaceIndex.load(testsuite_dir.parent)
+    suites: List[Tuple[str, SuiteFileInfo, Path]] = []
+    for rel, info in index.suite_files.items():
+        fp = index.path(rel)
+        if fp.parent != testsuite_dir or not fp.match('*.xml'):
+            continue
+        if info.error:
+            print(f"  WARNING: could not parse {fp}: {info.error}", file=sys.stderr)
             continue
-        suites.append((fp.stem, tree, fp))
+        suites.append((fp.stem, info, fp))
     return suites
 
 
@@ -118,7 +99,7 @@ def discover_suites(
 # ---------------------------------------------------------------------------
 
 def _collect_suite_cases(
-    suite_tree: ET.ElementTree,
+    suite_info: SuiteFileInfo,
     suite_name: str,
 ) -> List[Tuple[str, str, str]]:
     """
@@ -127,32 +108,83 @@ def _collect_suite_cases(
     Groups with no live capltestcase children are skipped (e.g. fully
     commented-out blocks).
     """
-    suite_root = suite_tree.getroot()
-    cases: List[Tuple[str, str, str]] = []
-
-    for tg_elem in suite_root.iter('testgroup'):
-        tg_title = tg_elem.get('title', 'Group')
-        for tc_elem in tg_elem.findall('capltestcase'):
-            tc_name = tc_elem.get('name', '').strip()
-            if not tc_name:
-                continue
-            tc_title = tc_elem.get('title', tc_name)
-            cases.append((tg_title, tc_name, tc_title))
-
-    # Top-level <capltestcase> elements not inside any <testgroup>
-    for tc_elem in suite_root.findall('capltestcase'):
-        tc_name = tc_elem.get('name', '').strip()
-        if not tc_name:
-            continue
-        tc_title = tc_elem.get('title', tc_name)
-        cases.append(('(ungrouped)', tc_name, tc_title))
+    return [tuple(case) for case in suite_info.cases]
+
+
+class _XMLWriter:
+    """
+    Streaming XML writer whose output is byte-identical to building the
+    tree, running ET.indent(space='    ') and ElementTree.write() on it:
+    same attribute escaping (&quot;, &#10;, …), ' />' for empty elements
+    and the same indentation whitespace.  Elements are written as they are
+    opened, so no tree is held in memory.  Markup goes straight to *out* (a
+    text stream); XMLGenerator is only used for the declaration and for
+    escaping character data.
+    """
 
-    return cases
+    INDENT = '    '
+
+    def __init__(self, out) -> None:
+        self._out = out
+        self._sax = XMLGenerator(out, encoding='UTF-8')
+        self._open: List[List] = []    # [tag, has_children] per open element
+        self._pending = False          # start tag written without its closing '>'
+
+    @staticmethod
+    def open(path: Path):
+        """Text stream matching ElementTree.write(encoding='UTF-8') byte for byte."""
+        return path.open('w', encoding='utf-8', errors='xmlcharrefreplace', newline='\n')
+
+    def _close_start_tag(self) -> None:
+        if self._pending:
+            self._out.write('>')
+            self._pending = False
+
+    def start_document(self) -> None:
+        self._sax.startDocument()
+
+    def end_document(self) -> None:
+        self._out.write('\n')
+
+    def start(self, tag: str, attrs: Dict[str, str]) -> None:
+        self._close_start_tag()
+        if self._open:
+            self._open[-1][1] = True
+            self._out.write('\n' + self.INDENT * len(self._open))
+        self._out.write('<' + tag)
+        for key, value in attrs.items():
+            self._out.write(f' {key}="{escape(value, _ATTR_ENTITIES)}"')
+        self._pending = True
+        self._open.append([tag, False])
+
+    def text(self, text: str) -> None:
+        if text:
+            self._close_start_tag()
+            self._sax.characters(text)
+
+    def end(self) -> None:
+        tag, has_children = self._open.pop()
+        if self._pending:
+            self._out.write(' />')
+            self._pending = False
+            return
+        if has_children:
+            self._out.write('\n' + self.INDENT * len(self._open))
+        self._out.write(f'</{tag}>')
+
+    def leaf(self, tag: str, attrs: Dict[str, str], text: str) -> None:
+        self.start(tag, attrs)
+        self.text(text)
+        self.end()
+
+
+# Attribute escapes applied by ElementTree on top of &, < and >
+_ATTR_ENTITIES = {'"': '&quot;', '\r': '&#13;', '\n': '&#10;', '\t': '&#09;'}
 
 
 def _write_canoe_xml(
     suite_name: str,
-    suite_tree: ET.ElementTree,
+    suite_info: SuiteFileInfo,
     defined: Dict[str, Path],
     out_path: Path,
     root_dir: Path,
@@ -161,63 +193,57 @@ def _write_canoe_xml(
     Write a CANoe testmodule-schema XML file for merge_reports.py.
     Returns (found_count, missing_count).
     """
-    suite_root = suite_tree.getroot()
-    title      = suite_root.get('title', suite_name)
+    title      = suite_info.title if suite_info.title is not None else suite_name
     ts         = datetime.datetime.now().isoformat(timespec='seconds')
 
-    mod_elem = ET.Element(
-        'testmodule',
-        title=f"{title} [Simulation]",
-        generated=ts,
-        note="Syntax validated only. Actual results require hardware execution.",
-    )
-
-    cases      = _collect_suite_cases(suite_tree, suite_name)
+    cases      = _collect_suite_cases(suite_info, suite_name)
     found      = 0
     missing    = 0
 
-    # Group by tg_title
-    from itertools import groupby
-    for tg_title, group_iter in groupby(cases, key=lambda t: t[0]):
-        grp_elem = ET.SubElement(mod_elem, 'testgroup', title=tg_title)
-        for _, tc_name, tc_title in group_iter:
-            if tc_name in defined:
-                verdict = 'simulated'
-                src     = str(defined[tc_name].relative_to(root_dir))
-                desc    = f"Syntax validated. Source: {src}"
-                found  += 1
-            else:
-                verdict = 'error'
-                desc    = (
-                    f"ERROR: testcase '{tc_name}' not found in any .can file. "
-                    "Check CAPL source or XML suite configuration."
-                )
-                missing += 1
-
-            tc_elem   = ET.SubElement(grp_elem, 'testcase',
-                                      name=tc_name, title=tc_title,
-                                      verdict=verdict)
-            step_elem = ET.SubElement(tc_elem, 'step',
-                                      name='Simulation', verdict=verdict)
-            desc_elem = ET.SubElement(step_elem, 'description')
-            desc_elem.text = desc
-
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    tree = ET.ElementTree(mod_elem)
-    # ET.indent available since Python 3.9; fall back gracefully on older builds
-    if hasattr(ET, 'indent'):
-        ET.indent(tree, space='    ')
-    with out_path.open('wb') as fh:
-        fh.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        tree.write(fh, encoding='UTF-8', xml_declaration=False)
-        fh.write(b'\n')
+    with _XMLWriter.open(out_path) as fh:
+        xml = _XMLWriter(fh)
+        xml.start_document()
+        xml.start('testmodule', {
+            'title':     f"{title} [Simulation]",
+            'generated': ts,
+            'note':      "Syntax validated only. Actual results require hardware execution.",
+        })
+
+        # Group by tg_title
+        from itertools import groupby
+        for tg_title, group_iter in groupby(cases, key=lambda t: t[0]):
+            xml.start('testgroup', {'title': tg_title})
+            for _, tc_name, tc_title in group_iter:
+                if tc_name in defined:
+                    verdict = 'simulated'
+                    src     = str(defined[tc_name].relative_to(root_dir))
+                    desc    = f"Syntax validated. Source: {src}"
+                    found  += 1
+                else:
+                    verdict = 'error'
+                    desc    = (
+                        f"ERROR: testcase '{tc_name}' not found in any .can file. "
+                        "Check CAPL source or XML suite configuration."
+                    )
+                    missing += 1
+
+                xml.start('testcase', {'name': tc_name, 'title': tc_title, 'verdict': verdict})
+                xml.start('step', {'name': 'Simulation', 'verdict': verdict})
+                xml.leaf('description', {}, desc)
+                xml.end()
+                xml.end()
+            xml.end()
+
+        xml.end()
+        xml.end_document()
 
     return found, missing
 
 
 def _write_junit_xml(
     suite_name: str,
-    suite_tree: ET.ElementTree,
+    suite_info: SuiteFileInfo,
     defined: Dict[str, Path],
     out_path: Path,
 ) -> Tuple[int, int]:
@@ -225,59 +251,79 @@ def _write_junit_xml(
     Write a JUnit-schema XML file for the Jenkins junit() step.
     Returns (found_count, missing_count).
     """
-    suite_root  = suite_tree.getroot()
-    title       = suite_root.get('title', suite_name)
+    title       = suite_info.title if suite_info.title is not None else suite_name
     ts          = datetime.datetime.now().isoformat(timespec='seconds')
-    cases       = _collect_suite_cases(suite_tree, suite_name)
+    cases       = _collect_suite_cases(suite_info, suite_name)
 
     errors  = sum(1 for _, tc, _ in cases if tc not in defined)
     total   = len(cases)
 
-    suite_elem = ET.Element(
-        'testsuite',
-        name=f"{title} [Simulation]",
-        tests=str(total),
-        failures='0',
-        errors=str(errors),
-        skipped='0',
-        time='0',
-        timestamp=ts,
-    )
-
-    for tg_title, tc_name, _ in cases:
-        classname = f"{suite_name}.{tg_title}"
-        tc_elem   = ET.SubElement(suite_elem, 'testcase',
-                                   name=tc_name, classname=classname,
-                                   time='0')
-        if tc_name not in defined:
-            err = ET.SubElement(tc_elem, 'error',
-                                message="Testcase not found in any .can file")
-            err.text = (
-                f"<capltestcase name=\"{tc_name}\"/> referenced in "
-                f"{suite_name}.xml has no matching testcase definition "
-                "in any .can file under GM_VIP_Automation."
-            )
-        else:
-            out = ET.SubElement(tc_elem, 'system-out')
-            out.text = (
-                "SIMULATED: Syntax validated. "
-                "Testcase definition found in CAPL source. "
-                "Awaiting physical hardware execution for actual result."
-            )
-
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    tree = ET.ElementTree(suite_elem)
-    if hasattr(ET, 'indent'):
-        ET.indent(tree, space='    ')
-    with out_path.open('wb') as fh:
-        fh.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
-        tree.write(fh, encoding='UTF-8', xml_declaration=False)
-        fh.write(b'\n')
+    with _XMLWriter.open(out_path) as fh:
+        xml = _XMLWriter(fh)
+        xml.start_document()
+        xml.start('testsuite', {
+            'name':      f"{title} [Simulation]",
+            'tests':     str(total),
+            'failures':  '0',
+            'errors':    str(errors),
+            'skipped':   '0',
+            'time':      '0',
+            'timestamp': ts,
+        })
+
+        for tg_title, tc_name, _ in cases:
+            classname = f"{suite_name}.{tg_title}"
+            xml.start('testcase', {'name': tc_name, 'classname': classname, 'time': '0'})
+            if tc_name not in defined:
+                xml.leaf(
+                    'error',
+                    {'message': "Testcase not found in any .can file"},
+                    f"<capltestcase name=\"{tc_name}\"/> referenced in "
+                    f"{suite_name}.xml has no matching testcase definition "
+                    "in any .can file under GM_VIP_Automation.",
+                )
+            else:
+                xml.leaf(
+                    'system-out',
+                    {},
+                    "SIMULATED: Syntax validated. "
+                    "Testcase definition found in CAPL source. "
+                    "Awaiting physical hardware execution for actual result.",
+                )
+            xml.end()
+
+        xml.end()
+        xml.end_document()
 
     found = total - errors
     return found, errors
 
 
+# Shared by every suite; set once per worker process by _init_worker() so the
+# definitions are not pickled again for each suite.
+_defined: Dict[str, Path] = {}
+_root_dir: Optional[Path] = None
+
+
+def _init_worker(defined: Dict[str, Path], root_dir: Path) -> None:
+    global _defined, _root_dir
+    _defined, _root_dir = defined, root_dir
+
+
+def _write_suite_reports(item: Tuple[str, SuiteFileInfo, str, str]) -> Tuple[int, int]:
+    """
+    Write the CANoe and JUnit XML of one suite; returns (found, missing).
+    Process-pool entry point (must be a top-level function to be picklable).
+    """
+    suite_name, suite_info, canoe_out, junit_out = item
+    found, missing = _write_canoe_xml(
+        suite_name, suite_info, _defined, Path(canoe_out), _root_dir
+    )
+    _write_junit_xml(suite_name, suite_info, _defined, Path(junit_out))
+    return found, missing
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -305,6 +351,13 @@ def main() -> int:
             "Default: <root>/Test Reports/simulation"
         ),
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=("Number of worker processes for writing the suite reports (0 = one per CPU, default: 1). "
+              "Only pays off for many large suites; process start-up dominates otherwise"),
+    )
     args = parser.parse_args()
     root: Path = args.root.resolve()
 
@@ -319,7 +372,8 @@ def main() -> int:
     # Step 1: discover all testcase definitions from .can files
     # ------------------------------------------------------------------
     print(f"Scanning for testcase definitions under: {root}")
-    defined = discover_testcases(root)
+    index = WorkspaceIndex.load(root)
+    defined = discover_testcases(root, index)
     print(f"  {len(defined)} testcase definition(s) found in .can files")
 
     # ------------------------------------------------------------------
@@ -333,7 +387,7 @@ def main() -> int:
         )
         return 1
 
-    suites = discover_suites(testsuite_dir)
+    suites = discover_suites(testsuite_dir, index)
     if not suites:
         print(
             "ERROR: no XML suite files found in Testsuite_Environment/",
@@ -365,15 +419,28 @@ def main() -> int:
         "",
     ]
 
-    for suite_name, suite_tree, suite_path in suites:
+    # The definitions were discovered once above; each suite only reads them,
+    # so with --jobs the per-suite report writing can go to a worker pool
+    # (each worker receives the definitions once, via _init_worker).
+    work = [
+        (suite_name, suite_info,
+         str(out_dir / f"{suite_name}_simulated.xml"),
+         str(junit_dir / f"{suite_name}_junit.xml"))
+        for suite_name, suite_info, _ in suites
+    ]
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if jobs > 1 and len(work) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work)),
+                                 initializer=_init_worker, initargs=(defined, root)) as pool:
+            counts = list(pool.map(_write_suite_reports, work))
+    else:
+        _init_worker(defined, root)
+        counts = [_write_suite_reports(item) for item in work]
+
+    for (suite_name, suite_info, suite_path), (found, missing) in zip(suites, counts):
         canoe_out = out_dir  / f"{suite_name}_simulated.xml"
         junit_out = junit_dir / f"{suite_name}_junit.xml"
 
-        found, missing = _write_canoe_xml(
-            suite_name, suite_tree, defined, canoe_out, root
-        )
-        _write_junit_xml(suite_name, suite_tree, defined, junit_out)
-
         total_found   += found
         total_missing += missing
 
@@ -381,7 +448,7 @@ def main() -> int:
         print(f"  [{status}] {suite_name:40s}  {found:4d} found  {missing:3d} missing")
         if missing > 0:
             # List the missing names for easy diagnosis
-            cases = _collect_suite_cases(suite_tree, suite_name)
+            cases = _collect_suite_cases(suite_info, suite_name)
             for _, tc_name, _ in cases:
                 if tc_name not in defined:
                     print(f"          ! {tc_name}")
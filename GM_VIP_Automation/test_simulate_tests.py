@@ -0,0 +1,82 @@
+"""
+test_simulate_tests.py  –  Byte-equality checks for simulate_tests.py
+======================================================================
+The streaming _XMLWriter must produce exactly what building the tree,
+running ET.indent(space='    ') and ElementTree.write() produced before,
+so regenerated reports only differ in their timestamps.
+
+Usage
+-----
+    python -m unittest discover -s GM_VIP_Automation -p "test_*.py"
+"""
+
+import io
+import random
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from simulate_tests import _XMLWriter
+
+
+# Characters that exercise every escaping rule (&, <, >, ", quotes, \r, \n,
+# \t), non-ASCII text, an astral character and a lone surrogate.
+_ALPHABET = 'ab Z09&<>"\'\r\n\t]]>é€\U0001F600\ud800'
+
+
+def _random_text(rng: random.Random) -> str:
+    return ''.join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 12)))
+
+
+def _random_tree(rng: random.Random, depth: int = 0) -> ET.Element:
+    attrs = {f"a{i}": _random_text(rng) for i in range(rng.randint(0, 3))}
+    elem = ET.Element(rng.choice(['testmodule', 'testgroup', 'testcase', 'step']), attrs)
+    if depth < 4 and rng.random() < 0.6:
+        for _ in range(rng.randint(1, 4)):
+            elem.append(_random_tree(rng, depth + 1))
+    else:
+        elem.text = _random_text(rng)
+    return elem
+
+
+def _etree_bytes(root: ET.Element) -> bytes:
+    """The serialisation simulate_tests.py used before it streamed its output."""
+    tree = ET.ElementTree(root)
+    ET.indent(tree, space='    ')
+    out = io.BytesIO()
+    out.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+    tree.write(out, encoding='UTF-8', xml_declaration=False)
+    out.write(b'\n')
+    return out.getvalue()
+
+
+def _emit(xml: _XMLWriter, elem: ET.Element):
+    if len(elem):
+        xml.start(elem.tag, dict(elem.attrib))
+        for child in elem:
+            _emit(xml, child)
+        xml.end()
+    else:
+        xml.leaf(elem.tag, dict(elem.attrib), elem.text or '')
+
+
+class XMLWriterTest(unittest.TestCase):
+
+    def test_matches_elementtree_byte_for_byte(self):
+        rng = random.Random(20260314)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.xml'
+            for _ in range(500):
+                root = _random_tree(rng)
+                expected = _etree_bytes(root)
+                with _XMLWriter.open(path) as fh:
+                    xml = _XMLWriter(fh)
+                    xml.start_document()
+                    _emit(xml, root)
+                    xml.end_document()
+                self.assertEqual(path.read_bytes(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
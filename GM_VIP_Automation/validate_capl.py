@@ -38,10 +38,27 @@ Checks performed
                              with a closing ')' but have no terminating ';'
                              (a common copy-paste mistake that causes a parse
                              error on the *next* line rather than the culprit).
+11. Include graph          – every testfunction a .can module calls must be
+                             reachable through its (transitive) #include chain;
+                             includes whose symbols are never referenced are
+                             reported as warnings (they do not fail the run).
 
 Usage
 -----
-    python validate_capl.py [--root <GM_VIP_Automation folder>]
+    python validate_capl.py [--root <GM_VIP_Automation folder>] [--jobs N] [--no-cache] [--watch]
+                            [--sarif <file.sarif>] [--junit <file.xml>]
+
+Per-file results are cached in <root>/.validate_capl_cache.json keyed by
+file content hash, so repeated runs only re-check files that changed.
+With --watch the script keeps running after the first pass and, on every
+save, re-checks the changed file(s) and prints what appeared / disappeared
+in the issue list (uses the optional watchdog package for change
+notifications, and polls the tree without it).
+
+--sarif / --junit write the same issues (file, line, column, rule id,
+severity) as a SARIF 2.1.0 log and as a JUnit XML with one testcase per
+checked file, for code-scanning viewers, Jenkins junit() and
+merge_reports.py.
 
 Exit code
 ---------
@@ -50,139 +67,117 @@ Exit code
 """
 
 import argparse
+import datetime
+import hashlib
+import json
 import os
+import queue
 import re
 import sys
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Callable
+from urllib.parse import quote
+
+from workspace_index import INDEX_FILENAME, CaplLex, IncludeGraph, WorkspaceIndex, lex_capl, read_capl_text
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional: --watch polls the tree instead
+    Observer = None
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _strip_line_comments(text: str) -> str:
-    """Remove // … comments (but not inside strings)."""
-    result = []
-    i = 0
-    in_string = False
-    while i < len(text):
-        ch = text[i]
-        if ch == '"' and (i == 0 or text[i - 1] != '\\'):
-            in_string = not in_string
-        if not in_string and ch == '/' and i + 1 < len(text) and text[i + 1] == '/':
-            # skip to end of line
-            while i < len(text) and text[i] != '\n':
-                i += 1
-            continue
-        result.append(ch)
-        i += 1
-    return ''.join(result)
+def strip_comments(text: str) -> str:
+    return lex_capl(text).cleaned
 
 
-def _strip_block_comments(text: str) -> str:
-    """Remove /* … */ block comments (but not inside strings)."""
-    result = []
-    i = 0
-    in_string = False
-    while i < len(text):
-        ch = text[i]
-        # Track string literal state to avoid stripping comment markers inside strings.
-        if ch == '"' and (i == 0 or text[i - 1] != '\\'):
-            in_string = not in_string
-        # Only treat /* as a comment start when we're not inside a string.
-        if not in_string and text[i:i + 2] == '/*':
-            i += 2
-            while i < len(text) and text[i:i + 2] != '*/':
-                if text[i] == '\n':
-                    result.append('\n')  # preserve line numbers
-                i += 1
-            # Skip the closing */
-            if i < len(text):
-                i += 2
-        else:
-            result.append(ch)
-            i += 1
-    return ''.join(result)
+# ---------------------------------------------------------------------------
+# Issues
+# ---------------------------------------------------------------------------
+#
+# Every check returns Issue objects.  str(issue) is the line printed on the
+# console; --sarif / --junit serialise the fields directly, so CI never has
+# to scrape the text output.
+#
+RULES: dict[str, str] = {
+    'bracket-balance':        "Unmatched, mismatched or unclosed bracket",
+    'include-missing':        "#include path does not resolve to a file",
+    'declaration-brace':      "testcase/testfunction declaration without an opening brace",
+    'xml-testcase-ref':       "<capltestcase> reference without a matching testcase definition",
+    'capl-api-name':          "Misspelled or wrong-case CAPL built-in name",
+    'forbidden-call':         "Call to a function that does not exist in CAPL",
+    'duplicate-definition':   "testcase/testfunction defined more than once in the same file",
+    'snprintf-format':        "snprintf format specifiers do not match the arguments",
+    'variables-block':        ".can test module without a top-level variables{} block",
+    'missing-semicolon':      "Statement line ending in ')' without a terminating ';'",
+    'undefined-testfunction': "testfunction call not reachable through the module's #include chain",
+    'unused-include':         "#include none of whose symbols is referenced",
+    'read-error':             "File could not be read",
+}
 
 
-def strip_comments(text: str) -> str:
-    text = _strip_block_comments(text)
-    text = _strip_line_comments(text)
-    return text
+@dataclass(frozen=True)
+class Issue:
+    rule: str                    # key of RULES
+    file: str                    # path as printed
+    line: int = 0                # 1-based; 0 = the file as a whole
+    col: int = 0                 # 1-based; 0 = the line as a whole
+    message: str = ''
+    severity: str = 'error'      # 'error' fails the run, 'warning' does not
+
+    def __str__(self) -> str:
+        where = self.file + (f":{self.line}" if self.line else '') + (f":{self.col}" if self.col else '')
+        return f"  {where}: {self.message}"
 
 
 # ---------------------------------------------------------------------------
 # Check 1 – bracket balance
 # ---------------------------------------------------------------------------
 
-def check_bracket_balance(filepath: Path, text: str) -> list[str]:
-    """Return a list of error strings for unmatched brackets (ignores string literals)."""
+_BRACKET_PAIRS = {')': '(', ']': '[', '}': '{'}
+
+
+def check_bracket_balance(filepath: Path, text: str, lexed: CaplLex | None = None) -> list[Issue]:
+    """Return issues for unmatched brackets (ignores string literals)."""
+    if lexed is None:
+        lexed = lex_capl(text)
     issues = []
-    pairs = {')': '(', ']': '[', '}': '{'}
-    openers = set('({[')
+    pairs = _BRACKET_PAIRS
     stack = []
-    flat = text
-
-    # Build line start offsets for efficient lineno/col lookup
-    line_start_offsets = [0]
-    for idx, ch in enumerate(flat):
-        if ch == '\n':
-            line_start_offsets.append(idx + 1)
-
-    def offset_to_linecol(offset: int):
-        lo, hi = 0, len(line_start_offsets) - 1
-        while lo < hi:
-            mid = (lo + hi + 1) // 2
-            if line_start_offsets[mid] <= offset:
-                lo = mid
-            else:
-                hi = mid - 1
-        return lo + 1, offset - line_start_offsets[lo] + 1
-
-    i = 0
-    n = len(flat)
-    in_string = False
-    while i < n:
-        ch = flat[i]
-        # Enter string literal
-        if ch == '"' and not in_string:
-            in_string = True
-            i += 1
-            continue
-        # Inside string literal
-        if in_string:
-            if ch == '\\':
-                i += 2  # skip escaped character
-                continue
-            if ch == '"':
-                in_string = False
-            i += 1
+    for ch, offset in lexed.brackets:
+        if ch not in pairs:
+            stack.append((ch, offset))
             continue
-        # Normal code — check brackets
-        if ch in openers:
-            lineno, col = offset_to_linecol(i)
-            stack.append((ch, lineno, col))
-        elif ch in pairs:
-            expected = pairs[ch]
-            lineno, col = offset_to_linecol(i)
-            if not stack:
-                issues.append(
-                    f"  {filepath}:{lineno}:{col}: unmatched closing '{ch}' (no opener on stack)"
-                )
-            elif stack[-1][0] != expected:
-                issues.append(
-                    f"  {filepath}:{lineno}:{col}: mismatched '{ch}' — expected close for"
-                    f" '{stack[-1][0]}' opened at line {stack[-1][1]}"
-                )
-                stack.pop()
-            else:
-                stack.pop()
-        i += 1
-    for opener, lineno, col in stack:
-        issues.append(
-            f"  {filepath}:{lineno}:{col}: unclosed '{opener}' — no matching close found"
-        )
+        if not stack:
+            lineno, col = lexed.line_col(offset)
+            issues.append(Issue(
+                'bracket-balance', str(filepath), lineno, col,
+                f"unmatched closing '{ch}' (no opener on stack)",
+            ))
+        elif stack[-1][0] != pairs[ch]:
+            lineno, col = lexed.line_col(offset)
+            issues.append(Issue(
+                'bracket-balance', str(filepath), lineno, col,
+                f"mismatched '{ch}' — expected close for"
+                f" '{stack[-1][0]}' opened at line {lexed.line_col(stack[-1][1])[0]}",
+            ))
+            stack.pop()
+        else:
+            stack.pop()
+    for opener, offset in stack:
+        lineno, col = lexed.line_col(offset)
+        issues.append(Issue(
+            'bracket-balance', str(filepath), lineno, col,
+            f"unclosed '{opener}' — no matching close found",
+        ))
     return issues
 
 
@@ -193,21 +188,26 @@ def check_bracket_balance(filepath: Path, text: str) -> list[str]:
 _INCLUDE_RE = re.compile(r'#include\s+"([^"]+)"')
 
 
-def check_includes(filepath: Path, text: str) -> list[str]:
-    """Return a list of error strings for #includes that cannot be resolved."""
-    issues = []
+def iter_includes(filepath: Path, text: str):
+    """Yield (lineno, include string, resolved path) for every #include in ``text``."""
     parent = filepath.parent
     for lineno, line in enumerate(text.splitlines(), start=1):
         m = _INCLUDE_RE.search(line)
         if not m:
             continue
         inc_path_raw = m.group(1).replace('\\', os.sep).replace('/', os.sep)
-        resolved = (parent / inc_path_raw).resolve()
+        yield lineno, m.group(1), (parent / inc_path_raw).resolve()
+
+
+def check_includes(filepath: Path, text: str) -> list[Issue]:
+    """Return issues for #includes that cannot be resolved."""
+    issues = []
+    for lineno, name, resolved in iter_includes(filepath, text):
         if not resolved.exists():
-            issues.append(
-                f"  {filepath}:{lineno}: #include not found: '{m.group(1)}'"
-                f" (resolved to {resolved})"
-            )
+            issues.append(Issue(
+                'include-missing', str(filepath), lineno, 0,
+                f"#include not found: '{name}' (resolved to {resolved})",
+            ))
     return issues
 
 
@@ -221,7 +221,7 @@ _DECL_NO_BRACE_RE = re.compile(
 )
 
 
-def check_declarations(filepath: Path, text: str) -> list[str]:
+def check_declarations(filepath: Path, text: str) -> list[Issue]:
     """
     Verify that every testcase/testfunction declaration is followed by an
     opening brace within the next few non-blank lines.
@@ -246,10 +246,10 @@ def check_declarations(filepath: Path, text: str) -> list[str]:
                 if ahead_line and not ahead_line.startswith('//'):
                     break  # non-blank, non-comment line that isn't {
         if not found_brace:
-            issues.append(
-                f"  {filepath}:{lineno}: declaration of '{func_name}' has no"
-                " opening brace within 3 lines"
-            )
+            issues.append(Issue(
+                'declaration-brace', str(filepath), lineno, 0,
+                f"declaration of '{func_name}' has no opening brace within 3 lines",
+            ))
     return issues
 
 
@@ -257,55 +257,121 @@ def check_declarations(filepath: Path, text: str) -> list[str]:
 # Check 4 – cross-file: XML testcase names vs .can definitions
 # ---------------------------------------------------------------------------
 
-_TESTCASE_DEF_RE = re.compile(
-    r'(?:export\s+)?testcase\s+(\w+)\s*\('
-)
-
-
-def collect_testcase_names_from_can(can_files: list[Path]) -> dict[str, Path]:
-    """Return mapping of testcase name → file for all .can files."""
-    defined: dict[str, Path] = {}
-    for fp in can_files:
-        try:
-            raw = fp.read_text(encoding='latin-1', errors='replace')
-        except OSError:
-            continue
-        cleaned = strip_comments(raw)
-        for m in _TESTCASE_DEF_RE.finditer(cleaned):
-            defined[m.group(1)] = fp
-    return defined
-
-
-def collect_testcase_refs_from_xml(xml_files: list[Path]) -> dict[str, Path]:
-    """Return mapping of capltestcase name → XML file."""
-    refs: dict[str, Path] = {}
-    for fp in xml_files:
-        try:
-            tree = ET.parse(fp)
-        except ET.ParseError:
-            continue
-        root = tree.getroot()
-        for elem in root.iter('capltestcase'):
-            name = elem.get('name', '').strip()
-            if name:
-                refs[name] = fp
-    return refs
-
-
 def check_xml_vs_can_consistency(
     defined: dict[str, Path], refs: dict[str, Path]
-) -> list[str]:
+) -> list[Issue]:
     """Report XML references that have no matching testcase definition."""
     issues = []
     for name, xml_fp in sorted(refs.items()):
         if name not in defined:
-            issues.append(
-                f"  {xml_fp}: <capltestcase name=\"{name}\"> has no"
-                " matching testcase definition in any .can file"
-            )
+            issues.append(Issue(
+                'xml-testcase-ref', str(xml_fp), 0, 0,
+                f"<capltestcase name=\"{name}\"> has no matching testcase definition in any .can file",
+            ))
     return issues
 
 
+# ---------------------------------------------------------------------------
+# Rule engine for the lint checks (checks 5 – 10)
+# ---------------------------------------------------------------------------
+#
+# Each lint rule registers a *trigger* pattern with @lint_rule, together with
+# the characters a trigger can start with.  All triggers are compiled into one
+# alternation behind a lookahead on those characters (so the regex engine
+# skips plain code between hits instead of trying every branch at every
+# offset), the cleaned text of a file is scanned once, and every hit is
+# dispatched to the callback of the rule whose trigger matched.  Triggers
+# are short, mutually exclusive tokens (a keyword, an API name, a line-ending
+# ')') so one rule's hit never hides another's; a callback that needs more
+# context re-matches its full pattern at the hit position.
+# Rules that decide something about the whole file (e.g. "has no variables
+# block") do so in an optional finish callback once the scan is done.
+#
+# Adding a check is: write a callback, decorate it – no extra pass per file.
+#
+
+class LintContext:
+    """Per-file state shared by the rule callbacks during one scan."""
+
+    def __init__(self, filepath: Path, lexed: CaplLex):
+        self.filepath = filepath
+        self.lexed = lexed
+        self.text = lexed.cleaned
+        self.issues: dict[str, list[Issue]] = {}
+        self.state: dict[str, object] = {}     # per-rule scratch space, keyed by rule name
+        self._lines: list[str] | None = None
+
+    @property
+    def lines(self) -> list[str]:
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number of an offset in the cleaned text."""
+        return self.lexed.line_col(offset)[0]
+
+    def report(self, rule: str, message: str, line: int = 0, col: int = 0) -> None:
+        self.issues.setdefault(rule, []).append(Issue(rule, str(self.filepath), line, col, message))
+
+
+@dataclass(frozen=True)
+class LintRule:
+    name: str
+    trigger: str                                             # regex, no named groups
+    starts: str                                              # characters a trigger match can start with
+    on_match: Callable[[LintContext, re.Match], None]
+    on_finish: Callable[[LintContext], None] | None = None
+
+
+class RuleEngine:
+    """Runs a set of LintRules over a file in a single combined regex scan."""
+
+    def __init__(self, rules: list[LintRule]):
+        self.rules = list(rules)
+        self._by_group = {f'r{i}': rule for i, rule in enumerate(self.rules)}
+        # Earlier rules win when two triggers match at the same offset.
+        first_chars = ''.join(sorted({re.escape(c) for rule in self.rules for c in rule.starts}))
+        self._scanner = re.compile(
+            f'(?=[{first_chars}])(?:'
+            + '|'.join(f'(?P<r{i}>{rule.trigger})' for i, rule in enumerate(self.rules))
+            + ')'
+        )
+
+    def run(self, filepath: Path, lexed: CaplLex) -> list[Issue]:
+        """Issues of every rule, grouped by rule in registration order."""
+        ctx = LintContext(filepath, lexed)
+        by_group = self._by_group
+        for m in self._scanner.finditer(ctx.text):
+            by_group[m.lastgroup].on_match(ctx, m)
+        for rule in self.rules:
+            if rule.on_finish:
+                rule.on_finish(ctx)
+        return [issue for rule in self.rules for issue in ctx.issues.get(rule.name, ())]
+
+
+LINT_RULES: list[LintRule] = []
+_lint_engine: RuleEngine | None = None
+
+
+def lint_rule(name: str, trigger: str, starts: str, on_finish: Callable[[LintContext], None] | None = None):
+    """Decorator registering a match callback as a lint rule (in check order)."""
+    def register(on_match):
+        global _lint_engine
+        LINT_RULES.append(LintRule(name, trigger, starts, on_match, on_finish))
+        _lint_engine = None
+        return on_match
+    return register
+
+
+def run_lint_rules(filepath: Path, lexed: CaplLex) -> list[Issue]:
+    """Run every registered lint rule over one lexed file (checks 5 – 10)."""
+    global _lint_engine
+    if _lint_engine is None:
+        _lint_engine = RuleEngine(LINT_RULES)
+    return _lint_engine.run(filepath, lexed)
+
+
 # ---------------------------------------------------------------------------
 # Check 5 – known CAPL API name typos / case errors
 # ---------------------------------------------------------------------------
@@ -326,25 +392,17 @@ _CAPL_API_TYPOS: dict[str, str] = {
     "testcasefail":  "testCaseFail",
 }
 
-# Pre-compiled regex: word-boundary match for each incorrect token so we don't
-# flag occurrences inside longer identifiers.
-_CAPL_TYPO_RE = re.compile(
-    r'\b(' + '|'.join(re.escape(k) for k in _CAPL_API_TYPOS) + r')\b'
-)
-
 
-def check_capl_api_names(filepath: Path, text: str) -> list[str]:
-    """Return error strings for known CAPL built-in name typos / case errors."""
-    issues = []
-    for lineno, line in enumerate(text.splitlines(), start=1):
-        for m in _CAPL_TYPO_RE.finditer(line):
-            wrong = m.group(1)
-            correct = _CAPL_API_TYPOS[wrong]
-            issues.append(
-                f"  {filepath}:{lineno}:{m.start() + 1}: "
-                f"incorrect CAPL API name '{wrong}' — use '{correct}' instead"
-            )
-    return issues
+# Word-boundary match for each incorrect token so we don't flag occurrences
+# inside longer identifiers.
+@lint_rule('capl-api-name', r'\b(?:' + '|'.join(re.escape(k) for k in _CAPL_API_TYPOS) + r')\b',
+           starts=''.join(k[0] for k in _CAPL_API_TYPOS))
+def check_capl_api_names(ctx: LintContext, m: re.Match) -> None:
+    """Known CAPL built-in name typos / case errors."""
+    wrong = m.group()
+    lineno, col = ctx.lexed.line_col(m.start())
+    ctx.report('capl-api-name',
+        f"incorrect CAPL API name '{wrong}' — use '{_CAPL_API_TYPOS[wrong]}' instead", lineno, col)
 
 
 # ---------------------------------------------------------------------------
@@ -366,24 +424,17 @@ _CAPL_FORBIDDEN: dict[str, tuple[str, str]] = {
     "TestAbort":  ("testCaseFail()", "TestAbort() does not exist in CAPL; use testCaseFail() to abort a test case"),
 }
 
-# Word-boundary regex for each forbidden token
-_FORBIDDEN_RE = re.compile(
-    r'\b(' + '|'.join(re.escape(k) for k in _CAPL_FORBIDDEN) + r')\s*\('
-)
 
-
-def check_forbidden_identifiers(filepath: Path, text: str) -> list[str]:
-    """Return error strings for CAPL forbidden / non-existent function calls."""
-    issues = []
-    for lineno, line in enumerate(text.splitlines(), start=1):
-        for m in _FORBIDDEN_RE.finditer(line):
-            token = m.group(1)
-            replacement, reason = _CAPL_FORBIDDEN[token]
-            issues.append(
-                f"  {filepath}:{lineno}:{m.start() + 1}: "
-                f"forbidden call '{token}()' — {reason} (use {replacement} instead)"
-            )
-    return issues
+# Word-boundary match of each forbidden token followed by '(' on the same line
+@lint_rule('forbidden-call', r'\b(?:' + '|'.join(re.escape(k) for k in _CAPL_FORBIDDEN) + r')[^\S\n]*\(',
+           starts=''.join(k[0] for k in _CAPL_FORBIDDEN))
+def check_forbidden_identifiers(ctx: LintContext, m: re.Match) -> None:
+    """Calls to forbidden / non-existent CAPL functions."""
+    token = m.group()[:-1].rstrip()
+    replacement, reason = _CAPL_FORBIDDEN[token]
+    lineno, col = ctx.lexed.line_col(m.start())
+    ctx.report('forbidden-call',
+        f"forbidden call '{token}()' — {reason} (use {replacement} instead)", lineno, col)
 
 
 # ---------------------------------------------------------------------------
@@ -394,26 +445,30 @@ def check_forbidden_identifiers(filepath: Path, text: str) -> list[str]:
 # testcase or testfunction name is defined twice in the same file the linker
 # raises an "already defined" error.  This check catches the mistake early.
 #
-_FUNC_DEF_RE = re.compile(
-    r'(?:export\s+)?(?:testcase|testfunction)\s+(\w+)\s*\('
-)
-
-
-def check_duplicate_definitions(filepath: Path, text: str) -> list[str]:
-    """Return error strings for testcase/testfunction names defined more than once."""
-    seen: dict[str, int] = {}   # name → first lineno
-    issues = []
-    for lineno, line in enumerate(text.splitlines(), start=1):
-        for m in _FUNC_DEF_RE.finditer(line):
-            name = m.group(1)
-            if name in seen:
-                issues.append(
-                    f"  {filepath}:{lineno}: duplicate definition of '{name}'"
-                    f" (first defined at line {seen[name]})"
-                )
-            else:
-                seen[name] = lineno
-    return issues
+# The trigger is the keyword; the optional 'export' prefix never changes the
+# captured name.  A definition must fit on one line to count here, while
+# check 9 accepts the name and '(' on following lines.
+#
+_FUNC_DEF_LINE_RE = re.compile(r'test(?:case|function)[^\S\n]+(\w+)[^\S\n]*\(')
+_FUNC_DEF_ANY_RE = re.compile(r'test(?:case|function)\s+\w+\s*\(')
+
+
+@lint_rule('duplicate-definition', r'test(?:case|function)(?=\s)', starts='t')
+def check_duplicate_definitions(ctx: LintContext, m: re.Match) -> None:
+    """testcase/testfunction names defined more than once."""
+    if _FUNC_DEF_ANY_RE.match(ctx.text, m.start()):
+        ctx.state['has-test-definition'] = True       # consumed by check 9
+    d = _FUNC_DEF_LINE_RE.match(ctx.text, m.start())
+    if not d:
+        return
+    seen: dict[str, int] = ctx.state.setdefault('duplicate-definition', {})   # name → first lineno
+    name = d.group(1)
+    lineno = ctx.line_of(m.start())
+    if name in seen:
+        ctx.report('duplicate-definition',
+            f"duplicate definition of '{name}' (first defined at line {seen[name]})", lineno)
+    else:
+        seen[name] = lineno
 
 
 # ---------------------------------------------------------------------------
@@ -483,25 +538,27 @@ def _count_top_level_args(s: str) -> int:
     return count + (1 if has_content else 0)
 
 
-def check_snprintf_format_args(filepath: Path, text: str) -> list[str]:
-    """Return error strings where snprintf format-spec count ≠ argument count."""
-    issues = []
-    for m in _SNPRINTF_RE.finditer(text):
-        fmt = m.group(1)
-        rest = (m.group(2) or '').strip().lstrip(',').strip()
-        # Count specifiers, excluding %% (literal percent)
-        specs = [s for s in _FMT_SPEC_RE.findall(fmt) if s != '%%']
-        if not specs:
-            continue
-        n_args = _count_top_level_args(rest) if rest else 0
-        if n_args != len(specs):
-            lineno = text[:m.start()].count('\n') + 1
-            issues.append(
-                f"  {filepath}:{lineno}: snprintf format has {len(specs)}"
-                f" specifier(s) but {n_args} argument(s) provided"
-                f" (format: \"{fmt[:60]}{'...' if len(fmt) > 60 else ''}\")"
-            )
-    return issues
+@lint_rule('snprintf-format', r'\bsnprintf\b', starts='s')
+def check_snprintf_format_args(ctx: LintContext, m: re.Match) -> None:
+    """snprintf calls whose format-spec count ≠ argument count."""
+    if m.start() < ctx.state.get('snprintf-format', 0):
+        return                 # inside the previous call's arguments
+    call = _SNPRINTF_RE.match(ctx.text, m.start())
+    if not call:
+        return
+    ctx.state['snprintf-format'] = call.end()
+    fmt = call.group(1)
+    rest = (call.group(2) or '').strip().lstrip(',').strip()
+    # Count specifiers, excluding %% (literal percent)
+    specs = [s for s in _FMT_SPEC_RE.findall(fmt) if s != '%%']
+    if not specs:
+        return
+    n_args = _count_top_level_args(rest) if rest else 0
+    if n_args != len(specs):
+        ctx.report('snprintf-format',
+            f"snprintf format has {len(specs)} specifier(s) but {n_args} argument(s) provided"
+            f" (format: \"{fmt[:60]}{'...' if len(fmt) > 60 else ''}\")",
+            ctx.line_of(m.start()))
 
 
 # ---------------------------------------------------------------------------
@@ -516,25 +573,29 @@ def check_snprintf_format_args(filepath: Path, text: str) -> list[str]:
 _VARIABLES_BLOCK_RE = re.compile(r'\bvariables\s*\{')
 
 
-def check_variables_block(filepath: Path, text: str) -> list[str]:
-    """Return an error if a .can file that defines testcases has no variables{} block."""
+def _finish_variables_block(ctx: LintContext) -> None:
+    """Report a .can file that defines testcases but has no variables{} block."""
+    filepath = ctx.filepath
     # Only applies to .can files (not .cin libraries, which are permitted to
     # omit the variables block when they have no module-level state).
     if filepath.suffix.lower() != '.can':
-        return []
+        return
     # Skip example/documentation files
     if 'Docs' in filepath.parts:
-        return []
-    # Must contain at least one testcase or testfunction definition
-    has_testfunc = bool(_FUNC_DEF_RE.search(text))
-    if not has_testfunc:
-        return []
-    if not _VARIABLES_BLOCK_RE.search(text):
-        return [
-            f"  {filepath}: .can file defines testcase/testfunction but has no"
-            " top-level variables{} block — CANoe will reject this file"
-        ]
-    return []
+        return
+    # Must contain at least one testcase or testfunction definition (seen by check 7)
+    if not ctx.state.get('has-test-definition'):
+        return
+    if not ctx.state.get('variables-block'):
+        ctx.report('variables-block',
+            ".can file defines testcase/testfunction but has no"
+            " top-level variables{} block — CANoe will reject this file")
+
+
+@lint_rule('variables-block', r'\bvariables\b', starts='v', on_finish=_finish_variables_block)
+def check_variables_block(ctx: LintContext, m: re.Match) -> None:
+    if _VARIABLES_BLOCK_RE.match(ctx.text, m.start()):
+        ctx.state['variables-block'] = True
 
 
 # ---------------------------------------------------------------------------
@@ -552,6 +613,10 @@ def check_variables_block(filepath: Path, text: str) -> list[str]:
 # • the closing ')' is balanced (the line contains a matching '(')
 # … is flagged as likely missing a semicolon.
 #
+# The trigger is a ')' at the end of a line, optionally followed by a residual
+# '//' tail (see below); the brace depth is brought up to date lazily, with
+# str.count over the text between two hits.
+#
 _CONTROL_FLOW_RE = re.compile(r'^\s*(if|else\s+if|for|while|switch|do|else)\b')
 _FUNC_DECL_STYLE_RE = re.compile(
     r'^\s*(?:export\s+)?'
@@ -559,72 +624,487 @@ _FUNC_DECL_STYLE_RE = re.compile(
 )
 
 
-def check_missing_semicolons(filepath: Path, text: str) -> list[str]:
-    """Return warnings for statement lines that likely need a terminating ';'."""
-    issues = []
-    lines = text.splitlines()
-    brace_depth = 0
+@lint_rule('missing-semicolon', r'\)(?=[^\S\n]*(?://[^\n]*)?(?:\n|\Z))', starts=')')
+def check_missing_semicolons(ctx: LintContext, m: re.Match) -> None:
+    """Statement lines that likely need a terminating ';'."""
+    idx = ctx.line_of(m.start()) - 1
+    line_starts = ctx.lexed.line_starts
+    line_end = line_starts[idx + 1] if idx + 1 < len(line_starts) else len(ctx.text)
+
+    # Track brace depth (approximation — good enough for heuristics)
+    counted, brace_depth = ctx.state.get('missing-semicolon', (0, 0))
+    brace_depth += ctx.text.count('{', counted, line_end) - ctx.text.count('}', counted, line_end)
+    ctx.state['missing-semicolon'] = (line_end, brace_depth)
+    if brace_depth <= 0:
+        return                 # at file scope — function definitions are OK without ;
+
+    lines = ctx.lines
+    # Safety: strip any residual '//' (e.g. inside a string literal such as a URL)
+    clean = re.sub(r'//.*$', '', lines[idx].rstrip()).rstrip().strip()
+    if not clean:
+        return
+    if clean.startswith('#'):
+        return                 # preprocessor directives (#pragma, #include, …)
+    if not clean.endswith(')'):
+        return
+    # Skip control-flow keywords, including patterns like "{if (" or "} else if ("
+    if re.match(r'^\{?\s*(if|else\s*if|for|while|switch|do)\b', clean):
+        return
+    if re.match(r'^\}\s*(else\s*if|else)\b', clean):
+        return
+    if _CONTROL_FLOW_RE.match(clean):
+        return
+    # Skip boolean/logical continuation lines (multi-line condition)
+    if clean.startswith('||') or clean.startswith('&&'):
+        return
+    if _FUNC_DECL_STYLE_RE.match(clean):
+        return
+
+    # The closing ')' must be balanced by a matching opener on this very line
+    opens = clean.count('(')
+    closes = clean.count(')')
+    if opens == 0 or opens != closes:
+        return                 # unbalanced — multi-line call or complex expression
+
+    # Check that the next non-blank line is not '{' (= function/block opener)
     n = len(lines)
+    for ahead in range(1, 4):
+        if idx + ahead >= n:
+            break
+        nxt = re.sub(r'//.*$', '', lines[idx + ahead]).strip()
+        if nxt and not nxt.startswith('//'):
+            if nxt.startswith('{'):
+                break          # block opener — this is a declaration, not a call
+            ctx.report('missing-semicolon',
+                f"possible missing ';' after closing ')' — statement: {clean[:80]}", idx + 1)
+            break
 
-    for idx, line in enumerate(lines):
-        raw_line = line.rstrip()
 
-        # Safety: strip any residual inline comments the file-level stripper may
-        # have missed (can happen when in-string state drifts across a large file).
-        clean = re.sub(r'//.*$', '', raw_line).rstrip().strip()
+# ---------------------------------------------------------------------------
+# Check 11 – include graph: undefined testfunction calls / unused includes
+# ---------------------------------------------------------------------------
+#
+# CANoe compiles each .can test module together with everything it pulls in
+# through #include (transitively).  A testfunction defined in some library
+# .cin that the module never includes compiles fine in the editor of the
+# library but fails with "unknown function" in the module – so calls are
+# resolved against the module's transitive symbol table.  An include none of
+# whose (transitive) symbols are referenced is reported as a warning only:
+# it is harmless to the build but slows compilation and hides dependencies.
+# Includes that bring in event handlers (on start, on message ...) are never
+# considered unused, since the handlers act without being referenced.
+#
+_CALL_SITE_TEMPLATE = r'\b{}\s*\('
 
-        # Track brace depth (approximation — good enough for heuristics)
-        brace_depth += raw_line.count('{') - raw_line.count('}')
 
-        if brace_depth <= 0:
-            continue           # at file scope — function definitions are OK without ;
-        if not clean:
-            continue
-        if clean.startswith('#'):
-            continue           # preprocessor directives (#pragma, #include, …)
-        if not clean.endswith(')'):
-            continue
-        # Skip control-flow keywords, including patterns like "{if (" or "} else if ("
-        if re.match(r'^\{?\s*(if|else\s*if|for|while|switch|do)\b', clean):
-            continue
-        if re.match(r'^\}\s*(else\s*if|else)\b', clean):
-            continue
-        if _CONTROL_FLOW_RE.match(clean):
-            continue
-        # Skip boolean/logical continuation lines (multi-line condition)
-        if clean.startswith('||') or clean.startswith('&&'):
-            continue
-        if _FUNC_DECL_STYLE_RE.match(clean):
-            continue
+def _call_line(fp: Path, name: str) -> int:
+    """Line of the first call of *name* in *fp* (0 when it cannot be located)."""
+    try:
+        lexed = lex_capl(read_capl_text(fp.read_bytes()))
+    except OSError:
+        return 0
+    m = re.search(_CALL_SITE_TEMPLATE.format(re.escape(name)), lexed.cleaned)
+    return lexed.line_col(m.start())[0] if m else 0
 
-        # The closing ')' must be balanced by a matching opener on this very line
-        opens = clean.count('(')
-        closes = clean.count(')')
-        if opens == 0 or opens != closes:
-            continue           # unbalanced — multi-line call or complex expression
 
-        # Check that the next non-blank line is not '{' (= function/block opener)
-        for ahead in range(1, 4):
-            if idx + ahead >= n:
-                break
-            nxt = re.sub(r'//.*$', '', lines[idx + ahead]).strip()
-            if nxt and not nxt.startswith('//'):
-                if nxt.startswith('{'):
-                    break      # block opener — this is a declaration, not a call
-                lineno = idx + 1
-                issues.append(
-                    f"  {filepath}:{lineno}: possible missing ';' after"
-                    f" closing ')' — statement: {clean[:80]}"
-                )
-                break
+def check_include_graph(
+    index: WorkspaceIndex, graph: IncludeGraph | None = None, units=None
+) -> tuple[list[Issue], list[Issue]]:
+    """
+    Resolve every .can module (or just the given *units*) against its
+    #include closure.
 
-    return issues
+    Returns (issues, warnings): calls to testfunctions that exist in the tree
+    but are not reachable from the calling module, and includes whose
+    symbols are never referenced.
+    """
+    graph = graph or IncludeGraph(index)
+    owners = graph.testfunction_owners()
+    xml_called = {name for info in index.suite_files.values() for name in info.function_refs}
+    issues: list[Issue] = []
+    warnings: list[Issue] = []
+    reported: set[tuple[str, str]] = set()
+
+    for rel in sorted(index.capl_files if units is None else units):
+        if not rel.endswith('.can') or rel not in index.capl_files or index.capl_files[rel].error:
+            continue
+        unit = [rel, *sorted(graph.closure(rel))]
+        visible = graph.visible_symbols(rel)
+
+        for member in unit:
+            for name in index.capl_files[member].calls:
+                if name in owners and name not in visible and (member, name) not in reported:
+                    reported.add((member, name))
+                    fp = index.path(member)
+                    issues.append(Issue(
+                        'undefined-testfunction', str(fp), _call_line(fp, name), 0,
+                        f"call to testfunction '{name}' (defined in {owners[name]}) which is"
+                        f" not reachable through the #include chain of {rel}",
+                    ))
+
+        for include, line, target in graph.edges(rel):
+            if target is None:
+                continue            # missing includes are reported by check 2
+            provided = {target} | graph.closure(target)
+            if any(index.capl_files[f].has_handlers for f in provided):
+                continue
+            symbols = set().union(*(graph.symbols(f) for f in provided))
+            if not symbols or symbols & xml_called:
+                continue
+            used = set().union(*(index.capl_files[f].identifiers for f in unit if f not in provided))
+            if not symbols & used:
+                warnings.append(Issue(
+                    'unused-include', str(index.path(rel)), line, 0,
+                    f"#include \"{include}\" is unused – nothing it defines"
+                    " (directly or through its own includes) is referenced",
+                    severity='warning',
+                ))
+    return issues, warnings
 
 
 # ---------------------------------------------------------------------------
 # Main driver
 # ---------------------------------------------------------------------------
 
+CACHE_FILENAME = '.validate_capl_cache.json'
+
+
+def validate_capl_file(fp: Path, raw: str) -> dict:
+    """
+    Run every per-file check on one CAPL source.  The result holds what the
+    cache needs: the Issue objects (stored as dicts via asdict) and the
+    existence of every #include target, which is the only thing outside the
+    file's own content that the checks depend on.
+    """
+    lexed = lex_capl(raw)
+    cleaned = lexed.cleaned
+
+    file_issues = []
+    file_issues += check_bracket_balance(fp, cleaned, lexed)
+    file_issues += check_includes(fp, raw)            # raw: keep line numbers accurate
+    file_issues += check_declarations(fp, cleaned)
+    file_issues += run_lint_rules(fp, lexed)           # checks 5 – 10, one scan
+
+    return {
+        'issues': file_issues,
+        'includes': {str(resolved): resolved.exists() for _, _, resolved in iter_includes(fp, raw)},
+    }
+
+
+def _validate_worker(item: tuple[str, str]) -> dict:
+    """Process-pool entry point (must be a top-level function to be picklable)."""
+    fp, raw = item
+    return validate_capl_file(Path(fp), raw)
+
+
+def read_capl_source(fp: Path) -> tuple[str, str]:
+    """Return (content hash, text) for a CAPL file, decoded like read_text(encoding='latin-1')."""
+    data = fp.read_bytes()
+    return hashlib.sha1(data).hexdigest(), read_capl_text(data)
+
+
+class ValidationCache:
+    """
+    Per-file result cache persisted as JSON next to the scanned tree.  An
+    entry is reused when the file's content hash matches and none of its
+    #include targets has appeared or disappeared since.  The whole cache is
+    discarded when this script or workspace_index.py (lexer, readers, per-file
+    regexes) changes, or the root moves (Issue.file holds absolute paths).
+    """
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.key = {
+            'tool': hashlib.sha1(Path(__file__).read_bytes()).hexdigest(),
+            'lexer': hashlib.sha1(Path(__file__).with_name('workspace_index.py').read_bytes()).hexdigest(),
+            'root': str(root),
+        }
+        self.entries: dict[str, dict] = {}
+        self._used: dict[str, dict] = {}
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            if data.get('key') == self.key:
+                self.entries = data.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    def get(self, rel: str, digest: str) -> dict | None:
+        entry = self.entries.get(rel)
+        if not entry or entry['sha1'] != digest:
+            return None
+        if any(os.path.exists(p) != existed for p, existed in entry['result']['includes'].items()):
+            return None
+        self._used[rel] = entry
+        result = entry['result']
+        return {'issues': [Issue(**issue) for issue in result['issues']], 'includes': result['includes']}
+
+    def put(self, rel: str, digest: str, result: dict):
+        stored = {'issues': [asdict(issue) for issue in result['issues']], 'includes': result['includes']}
+        self._used[rel] = {'sha1': digest, 'result': stored}
+
+    def forget(self, rel: str):
+        self._used.pop(rel, None)
+
+    def save(self):
+        """Write back only the entries of files seen in this run (deleted files drop out)."""
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        try:
+            tmp.write_text(json.dumps({'key': self.key, 'files': self._used}), encoding='utf-8')
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            print(f"WARNING: could not write cache {self.path}: {exc}", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------
+# Machine-readable output (--sarif / --junit)
+# ---------------------------------------------------------------------------
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+def _relative_path(root: Path, file: str) -> str:
+    try:
+        return Path(file).resolve().relative_to(root).as_posix()
+    except ValueError:
+        return Path(file).as_posix()
+
+
+def _artifact_location(root: Path, file: str) -> dict:
+    """Percent-encoded URI relative to SRCROOT, or an absolute file: URI outside the root."""
+    path = Path(file).resolve()
+    try:
+        return {'uri': quote(path.relative_to(root).as_posix()), 'uriBaseId': 'SRCROOT'}
+    except ValueError:
+        return {'uri': path.as_uri()}
+
+
+def write_sarif(out_path: Path, root: Path, issues: list[Issue]):
+    """SARIF 2.1.0 log with one result per issue; paths relative to SRCROOT (= --root)."""
+    results = []
+    for issue in issues:
+        location = {'artifactLocation': _artifact_location(root, issue.file)}
+        if issue.line:
+            location['region'] = {'startLine': issue.line, **({'startColumn': issue.col} if issue.col else {})}
+        results.append({
+            'ruleId': issue.rule,
+            'level': issue.severity,
+            'message': {'text': issue.message},
+            'locations': [{'physicalLocation': location}],
+        })
+    sarif = {
+        '$schema': SARIF_SCHEMA,
+        'version': '2.1.0',
+        'runs': [{
+            'tool': {'driver': {
+                'name': 'validate_capl',
+                'rules': [{'id': rule, 'shortDescription': {'text': text}} for rule, text in RULES.items()],
+            }},
+            'originalUriBaseIds': {'SRCROOT': {'uri': root.as_uri() + '/'}},
+            'results': results,
+        }],
+    }
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(sarif, indent=2), encoding='utf-8')
+
+
+def write_junit(out_path: Path, root: Path, checked: list[Path], issues: list[Issue]):
+    """
+    JUnit XML for the Jenkins junit() step: one testcase per checked file
+    (plus any other file an issue points at, e.g. a suite XML), failing
+    when it has errors.  Warnings go to the testcase's system-out.
+    """
+    by_file: dict[str, list[Issue]] = {str(fp): [] for fp in checked}
+    for issue in issues:
+        by_file.setdefault(issue.file, []).append(issue)
+    failures = sum(1 for file_issues in by_file.values()
+                   if any(i.severity == 'error' for i in file_issues))
+
+    suite_elem = ET.Element(
+        'testsuite',
+        name="CAPL Validation",
+        tests=str(len(by_file)),
+        failures=str(failures),
+        errors='0',
+        skipped='0',
+        time='0',
+        timestamp=datetime.datetime.now().isoformat(timespec='seconds'),
+    )
+    for file, file_issues in sorted(by_file.items(), key=lambda item: _relative_path(root, item[0])):
+        rel = _relative_path(root, file)
+        package, _, name = rel.rpartition('/')
+        tc_elem = ET.SubElement(suite_elem, 'testcase', name=name,
+                                classname=package.replace('/', '.') or '(root)', time='0')
+        errors = [i for i in file_issues if i.severity == 'error']
+        warnings = [i for i in file_issues if i.severity == 'warning']
+        if errors:
+            failure = ET.SubElement(
+                tc_elem, 'failure',
+                message=f"{len(errors)} issue(s)",
+                type=', '.join(sorted({i.rule for i in errors})),
+            )
+            failure.text = '\n'.join(f"[{i.rule}] {str(i).strip()}" for i in errors)
+        if warnings:
+            out = ET.SubElement(tc_elem, 'system-out')
+            out.text = '\n'.join(f"WARNING [{i.rule}] {str(i).strip()}" for i in warnings)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tree = ET.ElementTree(suite_elem)
+    ET.indent(tree, space='    ')
+    with out_path.open('wb') as fh:
+        fh.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+        tree.write(fh, encoding='UTF-8', xml_declaration=False)
+        fh.write(b'\n')
+
+
+def write_reports(args, root: Path, checked: list[Path], issues: list[Issue]):
+    if args.sarif:
+        write_sarif(args.sarif, root, issues)
+    if args.junit:
+        write_junit(args.junit, root, checked, issues)
+
+
+# ---------------------------------------------------------------------------
+# Watch mode
+# ---------------------------------------------------------------------------
+#
+# --watch keeps the workspace index and every per-file result in memory after
+# the first run.  A batch of changes (an editor often writes a file several
+# times per save, hence the debounce) re-checks only the changed files and the
+# files that #include them directly – the only per-file check that looks
+# outside its own file is include existence – and then re-runs the cross-file
+# checks, which work purely on the in-memory index and take milliseconds.
+# The output is the diff of the issue list against the previous state.
+#
+# Change notifications come from the optional watchdog package (inotify,
+# ReadDirectoryChangesW, FSEvents); without it the tree is polled.
+#
+WATCH_DEBOUNCE = 0.05       # seconds without events before a batch is processed
+
+
+def _watchdog_batches(root: Path):
+    """Yield sets of changed paths; None in a set means 'rescan everything'."""
+    changes: queue.Queue = queue.Queue()
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                if event.event_type in ('moved', 'deleted'):
+                    changes.put(None)       # children are not reported individually
+                return
+            changes.put(event.src_path)
+            if getattr(event, 'dest_path', ''):
+                changes.put(event.dest_path)
+
+    observer = Observer()
+    observer.schedule(Handler(), str(root), recursive=True)
+    observer.start()
+    try:
+        while True:
+            try:
+                # Short timeout so Ctrl+C is honoured on Windows as well
+                batch = {changes.get(timeout=0.5)}
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.add(changes.get(timeout=WATCH_DEBOUNCE))
+                except queue.Empty:
+                    break
+            yield batch
+    finally:
+        observer.stop()
+        observer.join()
+
+
+def _poll_batches(interval: float):
+    while True:
+        time.sleep(interval)
+        yield {None}
+
+
+def _current_issues(index: WorkspaceIndex, results: dict[Path, dict]) -> set[Issue]:
+    """Every issue (and include-graph warning) for the in-memory state of the tree."""
+    issues = {issue for result in results.values() for issue in result['issues']}
+    if index.suite_files:
+        issues.update(check_xml_vs_can_consistency(index.testcase_definitions(), index.testcase_refs()))
+    graph_issues, graph_warnings = check_include_graph(index)
+    issues.update(graph_issues)
+    issues.update(graph_warnings)
+    return issues
+
+
+def _format(issue: Issue) -> str:
+    return f"WARNING:{issue}" if issue.severity == 'warning' else str(issue)
+
+
+def watch(root: Path, index: WorkspaceIndex, results: dict[Path, dict],
+          cache: 'ValidationCache | None', persist: bool, poll_interval: float,
+          on_update: Callable[[list[Issue]], None] | None = None) -> int:
+    """
+    Re-validate on every change until Ctrl+C; returns the exit code of the
+    final state.  *on_update* receives the full issue list after each batch.
+    """
+    current = _current_issues(index, results)
+    if Observer is not None:
+        batches = _watchdog_batches(root)
+        how = "file-system notifications"
+    else:
+        batches = _poll_batches(poll_interval)
+        how = f"polling every {poll_interval:g}s (install watchdog for change notifications)"
+    print(f"\nWatching {root} for changes – {how}.  Press Ctrl+C to stop.")
+
+    try:
+        for batch in batches:
+            start = time.perf_counter()
+            changed = index.rescan() if None in batch else index.update(batch)
+            if not changed:
+                continue
+            graph = IncludeGraph(index)
+            recheck = set(changed)
+            for rel in changed:
+                recheck.update(graph.includers(rel))
+            for rel in sorted(recheck):
+                fp = index.path(rel)
+                if rel not in index.capl_files:
+                    results.pop(fp, None)
+                    if cache:
+                        cache.forget(rel)
+                    continue
+                try:
+                    digest, raw = read_capl_source(fp)
+                except OSError as exc:
+                    results[fp] = {
+                        'issues': [Issue('read-error', str(fp), message=f"could not read file: {exc}")],
+                        'includes': {},
+                    }
+                    continue
+                results[fp] = validate_capl_file(fp, raw)
+                if cache:
+                    cache.put(rel, digest, results[fp])
+
+            previous, current = current, _current_issues(index, results)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"\n[{time.strftime('%H:%M:%S')}] {', '.join(changed)} changed –"
+                  f" {len(recheck)} file(s) re-checked in {elapsed_ms:.0f} ms")
+            for issue in sorted(current - previous, key=_format):
+                print(f"+ {_format(issue)}")
+            for issue in sorted(previous - current, key=_format):
+                print(f"- {_format(issue)}")
+            n_warnings = sum(1 for issue in current if issue.severity == 'warning')
+            print(f"= {len(current) - n_warnings} issue(s), {n_warnings} warning(s)"
+                  + ("" if current != previous else " (unchanged)"))
+
+            if on_update:
+                on_update(sorted(current, key=_format))
+            if persist:
+                index.save(root / INDEX_FILENAME)
+                if cache:
+                    cache.save()
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    return 1 if any(issue.severity == 'error' for issue in current) else 0
+
+
 def find_files(root: Path, extensions: list[str]) -> list[Path]:
     result = []
     for dirpath, _, filenames in os.walk(root):
@@ -644,6 +1124,46 @@ def main() -> int:
         default=Path(__file__).resolve().parent,
         help="Root directory of GM_VIP_Automation (default: same folder as this script)",
     )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help="Number of worker processes for the per-file checks (0 = one per CPU, default: 1)",
+    )
+    parser.add_argument(
+        '--cache',
+        type=Path,
+        default=None,
+        help=f"Per-file result cache (default: <root>/{CACHE_FILENAME})",
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Re-check every file; do not read or write the result cache or the workspace index",
+    )
+    parser.add_argument(
+        '--sarif',
+        type=Path,
+        default=None,
+        help="Also write the issues as a SARIF 2.1.0 log to this file",
+    )
+    parser.add_argument(
+        '--junit',
+        type=Path,
+        default=None,
+        help="Also write a JUnit XML (one testcase per checked file) to this file",
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help="After the first run, keep watching the tree and print issue-list diffs on every save",
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=0.5,
+        help="Seconds between tree scans in --watch mode when watchdog is not installed (default: 0.5)",
+    )
     args = parser.parse_args()
     root: Path = args.root.resolve()
 
@@ -651,7 +1171,9 @@ def main() -> int:
         print(f"ERROR: root directory not found: {root}", file=sys.stderr)
         return 1
 
-    capl_files = find_files(root, ['.can', '.cin'])
+    # One (incremental) walk of the tree shared with simulate_tests.py
+    index = WorkspaceIndex.load(root, persist=not args.no_cache)
+    capl_files = [index.path(rel) for rel in index.capl_files]
     testsuite_dir = root / 'Testsuite_Environment'
     if not testsuite_dir.is_dir():
         print(
@@ -661,33 +1183,49 @@ def main() -> int:
         )
         xml_files = []
     else:
-        xml_files = find_files(testsuite_dir, ['.xml'])
+        xml_files = [index.path(rel) for rel in index.suite_files]
 
-    all_issues: list[str] = []
+    all_issues: list[Issue] = []
 
     print(f"Scanning {len(capl_files)} CAPL file(s) and {len(xml_files)} XML file(s) under {root}\n")
 
-    # ---- Per-file checks ----
-    for fp in capl_files:
+    # ---- Per-file checks (cached, optionally in parallel) ----
+    cache = None if args.no_cache else ValidationCache(args.cache or root / CACHE_FILENAME, root)
+    results: dict[Path, dict] = {}
+    pending: list[tuple[Path, str, str]] = []     # (file, content hash, text) to check
+    read_errors: dict[Path, Issue] = {}
+    for rel, info in index.capl_files.items():
+        fp = index.path(rel)
+        # The index already knows each file's hash: unchanged files are not even read.
+        cached = cache.get(rel, info.sha1) if cache and not info.error else None
+        if cached is not None:
+            results[fp] = cached
+            continue
         try:
-            raw = fp.read_text(encoding='latin-1', errors='replace')
+            digest, raw = read_capl_source(fp)
         except OSError as exc:
-            all_issues.append(f"  {fp}: could not read file: {exc}")
+            read_errors[fp] = Issue('read-error', str(fp), message=f"could not read file: {exc}")
             continue
+        pending.append((fp, digest, raw))
 
-        cleaned = strip_comments(raw)
-
-        file_issues = []
-        file_issues += check_bracket_balance(fp, cleaned)
-        file_issues += check_includes(fp, raw)            # raw: keep line numbers accurate
-        file_issues += check_declarations(fp, cleaned)
-        file_issues += check_capl_api_names(fp, cleaned)
-        file_issues += check_forbidden_identifiers(fp, cleaned)
-        file_issues += check_duplicate_definitions(fp, cleaned)
-        file_issues += check_snprintf_format_args(fp, cleaned)
-        file_issues += check_variables_block(fp, cleaned)
-        file_issues += check_missing_semicolons(fp, cleaned)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            fresh = list(pool.map(_validate_worker, [(str(fp), raw) for fp, _, raw in pending], chunksize=2))
+    else:
+        fresh = [validate_capl_file(fp, raw) for fp, _, raw in pending]
+    for (fp, digest, _), result in zip(pending, fresh):
+        results[fp] = result
+        if cache:
+            cache.put(fp.relative_to(root).as_posix(), digest, result)
+    if cache:
+        cache.save()
 
+    for fp in capl_files:
+        if fp in read_errors:
+            all_issues.append(read_errors[fp])
+            continue
+        file_issues = results[fp]['issues']
         if file_issues:
             print(f"[FAIL] {fp.relative_to(root)}")
             for issue in file_issues:
@@ -700,8 +1238,9 @@ def main() -> int:
     # ---- Cross-file checks ----
     if xml_files:
         print("\n--- Cross-file consistency (XML test suites vs .can definitions) ---")
-        defined = collect_testcase_names_from_can(capl_files)
-        refs = collect_testcase_refs_from_xml(xml_files)
+        # Definitions and references come from the workspace index: no second read/parse pass.
+        defined = index.testcase_definitions()
+        refs = index.testcase_refs()
         cross_issues = check_xml_vs_can_consistency(defined, refs)
         if cross_issues:
             for issue in cross_issues:
@@ -710,14 +1249,37 @@ def main() -> int:
         else:
             print("[OK]   All XML <capltestcase> names resolved to a .can definition.")
 
+    print("\n--- Cross-file include graph (testfunction calls and #include usage) ---")
+    graph_issues, graph_warnings = check_include_graph(index)
+    for issue in graph_issues:
+        print(issue)
+    all_issues += graph_issues
+    for warning in graph_warnings:
+        print(f"WARNING:{warning}")
+    if not graph_issues and not graph_warnings:
+        print("[OK]   Every testfunction call resolves through the #include chain; no unused includes.")
+    elif not graph_issues:
+        print(f"[OK]   Every testfunction call resolves through the #include chain"
+              f" ({len(graph_warnings)} unused include warning(s) do not fail the run).")
+
+    print(f"\n{len(capl_files) - len(pending) - len(read_errors)} file(s) unchanged since the last run (cached),"
+          f" {len(pending)} checked" + (f" with {jobs} jobs" if jobs > 1 and len(pending) > 1 else "") + ".")
+
     # ---- Summary ----
     print(f"\n{'='*60}")
     if all_issues:
         print(f"RESULT: {len(all_issues)} issue(s) found. Fix before deploying to benches.")
-        return 1
     else:
         print("RESULT: No issues found. CAPL files are consistent.")
-        return 0
+
+    write_reports(args, root, capl_files, all_issues + graph_warnings)
+
+    if args.watch:
+        for fp, issue in read_errors.items():
+            results[fp] = {'issues': [issue], 'includes': {}}
+        return watch(root, index, results, cache, not args.no_cache, args.poll_interval,
+                     lambda issues: write_reports(args, root, [index.path(rel) for rel in index.capl_files], issues))
+    return 1 if all_issues else 0
 
 
 if __name__ == '__main__':
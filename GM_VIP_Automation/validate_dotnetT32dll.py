@@ -69,6 +69,8 @@ import re
 import sys
 from pathlib import Path
 
+from validate_capl import strip_comments
+
 
 # ---------------------------------------------------------------------------
 # Constants
@@ -371,52 +373,11 @@ def check_cin_api_consistency(t32_dir: Path, dll_symbols: set[str]) -> list[str]
 
 
 # ---------------------------------------------------------------------------
-# Comment stripping (same logic as validate_capl.py for consistency)
+# Comment stripping (shared CAPL lexer from validate_capl.py for consistency)
 # ---------------------------------------------------------------------------
 
-def _strip_line_comments(text: str) -> str:
-    result = []
-    i = 0
-    in_string = False
-    while i < len(text):
-        ch = text[i]
-        if ch == '"' and (i == 0 or text[i - 1] != '\\'):
-            in_string = not in_string
-        if not in_string and ch == '/' and i + 1 < len(text) and text[i + 1] == '/':
-            while i < len(text) and text[i] != '\n':
-                i += 1
-            continue
-        result.append(ch)
-        i += 1
-    return ''.join(result)
-
-
-def _strip_block_comments(text: str) -> str:
-    result = []
-    i = 0
-    in_string = False
-    while i < len(text):
-        ch = text[i]
-        if ch == '"' and (i == 0 or text[i - 1] != '\\'):
-            in_string = not in_string
-        if not in_string and text[i:i + 2] == '/*':
-            i += 2
-            while i < len(text) and text[i:i + 2] != '*/':
-                if text[i] == '\n':
-                    result.append('\n')
-                i += 1
-            if i < len(text):
-                i += 2
-        else:
-            result.append(ch)
-            i += 1
-    return ''.join(result)
-
-
 def _strip_comments(text: str) -> str:
-    text = _strip_block_comments(text)
-    text = _strip_line_comments(text)
-    return text
+    return strip_comments(text)
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,597 @@
+"""
+workspace_index.py - Shared parsed index of the GM_VIP_Automation tree
+======================================================================
+validate_capl.py and simulate_tests.py need the same facts about the
+workspace: which .can/.cin files exist, the testcases and testfunctions
+they define, what they #include, and which <capltestcase> names every
+Testsuite_Environment XML references.  This module gathers all of it in a
+single directory walk and persists it to <root>/.workspace_index.json.
+On the next run only files whose size or modification time changed are
+re-read and re-parsed; everything else is answered from the index.
+
+It also owns the CAPL lexer (lex_capl) so every tool strips comments and
+finds definitions the same way.
+
+Usage
+-----
+    from workspace_index import WorkspaceIndex
+    index = WorkspaceIndex.load(root)       # incremental scan, then saved
+
+    python workspace_index.py [--root <GM_VIP_Automation folder>] [--rebuild]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import stat
+import sys
+import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+
+INDEX_FILENAME = '.workspace_index.json'
+CAPL_EXTENSIONS = ('.can', '.cin')
+TESTSUITE_DIR = 'Testsuite_Environment'
+
+
+# ---------------------------------------------------------------------------
+# CAPL lexer
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CaplLex:
+    """
+    Result of lex_capl(): comment-free text plus the token positions every
+    check needs, computed once per file. All offsets refer to ``cleaned``.
+    """
+    cleaned: str
+    line_starts: list[int]                  # offset of the first char of each line
+    string_spans: list[tuple]               # [start, end) of "..." and '...' literals
+    brackets: list[tuple]                   # (char, offset) of ( ) [ ] { } outside literals
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        """1-based (line, column) of an offset in ``cleaned``."""
+        line = bisect_right(self.line_starts, offset) - 1
+        return line + 1, offset - self.line_starts[line] + 1
+
+
+# One alternation drives the whole lexer: at each position the earliest match
+# wins, so comment markers inside literals and quotes inside comments are
+# handled without any per-character Python loop.  Every branch starts with a
+# literal character so the regex engine can skip plain code between tokens,
+# and the literal/comment bodies are written as unrolled loops.  Unterminated
+# literals end at the newline; an unterminated block comment runs to EOF.
+_LEX_RE = re.compile(
+    r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'                # string literal
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"               # char literal
+    r'|//[^\n]*'                                    # line comment
+    r'|/\*[^*]*(?:\*+[^*/][^*]*)*(?:\*+/)?'         # block comment
+    r'|\(|\)|\{|\}|\[|\]'                           # brackets
+)
+_NEWLINE_RE = re.compile(r'\n')
+
+
+def lex_capl(text: str) -> CaplLex:
+    """
+    Single regex-driven pass over a CAPL source: strips // and /* */ comments
+    (block comments keep their newlines so line numbers stay accurate) and
+    records string-literal spans and the bracket token stream.
+    """
+    pieces = []
+    string_spans = []
+    brackets = []
+    pos = 0      # next unconsumed offset in text
+    out = 0      # length of cleaned text produced so far
+    for m in _LEX_RE.finditer(text):
+        start, end = m.span()
+        if start > pos:
+            pieces.append(text[pos:start])
+            out += start - pos
+        first = text[start]
+        if end - start == 1 and first not in '"\'':
+            brackets.append((first, out))
+            pieces.append(first)
+            out += 1
+        elif first == '/':
+            if text[start + 1] == '*':
+                newlines = text.count('\n', start, end)
+                if newlines:
+                    pieces.append('\n' * newlines)
+                    out += newlines
+        else:
+            string_spans.append((out, out + end - start))
+            pieces.append(m.group())
+            out += end - start
+        pos = end
+    pieces.append(text[pos:])
+    cleaned = ''.join(pieces)
+    line_starts = [0]
+    line_starts += [m.end() for m in _NEWLINE_RE.finditer(cleaned)]
+    return CaplLex(cleaned, line_starts, string_spans, brackets)
+
+
+# ---------------------------------------------------------------------------
+# Per-file parsing
+# ---------------------------------------------------------------------------
+
+# Same matches as validate_capl's (?:export\s+)?testcase\s+(\w+)\s*\( family,
+# but starting on a literal so the regex engine can skip ahead between hits;
+# the optional 'export' prefix never changes the captured name.
+DEFINITION_RE = re.compile(r'test(case|function)\s+(\w+)\s*\(')
+INCLUDE_RE = re.compile(r'#include\s+"([^"]+)"')
+FUNCTION_DEF_RE = re.compile(
+    r'^[ \t]*(?:export[ \t]+)?'
+    r'(?:void|byte|int|long|float|double|char|word|dword|qword|int64)(?:[ \t]*\[[ \t]*\])?'
+    r'[ \t]+(\w+)[ \t]*\(',
+    re.MULTILINE,
+)
+HANDLER_RE = re.compile(r'^[ \t]*on[ \t]+\w', re.MULTILINE)
+VARIABLES_BLOCK_RE = re.compile(r'\bvariables\s*\{')
+DECLARED_NAME_RE = re.compile(r'\b([A-Za-z_]\w*)\s*(?=[\[=;,])')
+TYPE_NAME_RE = re.compile(r'\b(?:struct|enum)\s+([A-Za-z_]\w*)')
+# Each identifier is consumed whole (group 2 is optional, so \w* never backtracks),
+# with group 2 set when it is followed by '(' - one scan yields both the
+# identifier set and the calls.
+IDENTIFIER_RE = re.compile(r'([A-Za-z_]\w*)(\s*\()?')
+_NOT_CALLS = frozenset(('if', 'for', 'while', 'switch', 'return', 'sizeof', 'elcount', 'do', 'else'))
+
+
+def _code_only(lexed: CaplLex) -> str:
+    """``cleaned`` with string/char literal contents blanked out (offsets preserved)."""
+    text = lexed.cleaned
+    pieces, pos = [], 0
+    for start, end in lexed.string_spans:
+        pieces.append(text[pos:start])
+        pieces.append(' ' * (end - start))
+        pos = end
+    pieces.append(text[pos:])
+    return ''.join(pieces)
+
+
+def _block_end(lexed: CaplLex, open_offset: int) -> int:
+    """Offset of the '}' closing the '{' at *open_offset* (end of text if unbalanced)."""
+    offsets = [offset for _, offset in lexed.brackets]
+    i = bisect_right(offsets, open_offset) - 1
+    depth = 0
+    for ch, offset in lexed.brackets[i:]:
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return offset
+    return len(lexed.cleaned)
+
+
+@dataclass
+class CaplFileInfo:
+    """Facts extracted from one .can/.cin file; (name, line) pairs are 1-based."""
+    sha1: str
+    mtime_ns: int
+    size: int
+    testcases: list[list] = field(default_factory=list)
+    testfunctions: list[list] = field(default_factory=list)
+    includes: list[list] = field(default_factory=list)     # (include string, line), comments excluded
+    functions: list[list] = field(default_factory=list)    # plain CAPL functions (void/int/... name(...))
+    variables: list[str] = field(default_factory=list)     # names/types declared in variables { } blocks
+    has_handlers: bool = False                             # defines 'on <event>' handlers
+    calls: list[str] = field(default_factory=list)         # names used as name(...), literals excluded
+    identifiers: list[str] = field(default_factory=list)   # every identifier used outside literals
+    error: str | None = None                               # set when the file could not be read
+
+
+@dataclass
+class SuiteFileInfo:
+    """Facts extracted from one Testsuite_Environment XML file."""
+    sha1: str
+    mtime_ns: int
+    size: int
+    title: str | None = None
+    cases: list[list] = field(default_factory=list)   # (group title, name, title) in document order
+    refs: list[str] = field(default_factory=list)     # every <capltestcase name>, document order
+    function_refs: list[str] = field(default_factory=list)  # every <capltestfunction name>
+    error: str | None = None                          # set when the XML could not be read/parsed
+
+
+def read_capl_text(data: bytes) -> str:
+    """Decode CAPL bytes the way read_text(encoding='latin-1') does (universal newlines)."""
+    return data.decode('latin-1').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def parse_capl_file(data: bytes, st: os.stat_result) -> CaplFileInfo:
+    lexed = lex_capl(read_capl_text(data))
+    cleaned = lexed.cleaned
+
+    info = CaplFileInfo(sha1=hashlib.sha1(data).hexdigest(), mtime_ns=st.st_mtime_ns, size=st.st_size)
+    for m in DEFINITION_RE.finditer(cleaned):
+        target = info.testcases if m.group(1) == 'case' else info.testfunctions
+        target.append([m.group(2), lexed.line_col(m.start())[0]])
+    info.includes = [[m.group(1), lexed.line_col(m.start())[0]] for m in INCLUDE_RE.finditer(cleaned)]
+
+    # Symbol table for the include graph (IncludeGraph)
+    code = _code_only(lexed)
+    info.functions = [[m.group(1), lexed.line_col(m.start(1))[0]] for m in FUNCTION_DEF_RE.finditer(code)]
+    variables = set()
+    for m in VARIABLES_BLOCK_RE.finditer(code):
+        body = code[m.end():_block_end(lexed, m.end() - 1)]
+        variables.update(DECLARED_NAME_RE.findall(body))
+        variables.update(TYPE_NAME_RE.findall(body))
+    info.variables = sorted(variables)
+    info.has_handlers = bool(HANDLER_RE.search(code))
+    tokens = IDENTIFIER_RE.findall(code)
+    info.identifiers = sorted({name for name, _ in tokens})
+    info.calls = sorted({name for name, paren in tokens if paren} - _NOT_CALLS)
+    return info
+
+
+def suite_cases(suite_root: ET.Element) -> list[list]:
+    """
+    [(group_title, tc_name, tc_title), ...] for every <capltestcase> in a
+    suite XML: grouped ones in document order, then top-level ones as
+    '(ungrouped)'.  Groups with no live capltestcase children contribute
+    nothing (e.g. fully commented-out blocks).
+    """
+    cases = []
+    for tg_elem in suite_root.iter('testgroup'):
+        tg_title = tg_elem.get('title', 'Group')
+        for tc_elem in tg_elem.findall('capltestcase'):
+            tc_name = tc_elem.get('name', '').strip()
+            if tc_name:
+                cases.append([tg_title, tc_name, tc_elem.get('title', tc_name)])
+    for tc_elem in suite_root.findall('capltestcase'):
+        tc_name = tc_elem.get('name', '').strip()
+        if tc_name:
+            cases.append(['(ungrouped)', tc_name, tc_elem.get('title', tc_name)])
+    return cases
+
+
+def parse_suite_file(data: bytes, st: os.stat_result) -> SuiteFileInfo:
+    info = SuiteFileInfo(sha1=hashlib.sha1(data).hexdigest(), mtime_ns=st.st_mtime_ns, size=st.st_size)
+    try:
+        suite_root = ET.fromstring(data)
+    except ET.ParseError as exc:
+        info.error = str(exc)
+        return info
+    info.title = suite_root.get('title')
+    info.cases = suite_cases(suite_root)
+    info.refs = [name for name in (e.get('name', '').strip() for e in suite_root.iter('capltestcase')) if name]
+    info.function_refs = [
+        name for name in (e.get('name', '').strip() for e in suite_root.iter('capltestfunction')) if name
+    ]
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+def _scan_tree(root: Path):
+    """
+    One walk over *root* (same coverage as os.walk without following
+    symlinked directories).  Returns sorted [(Path, stat)] lists for CAPL
+    sources anywhere and for XML files under Testsuite_Environment/.
+    """
+    capl, suites = [], []
+    testsuite_dir = root / TESTSUITE_DIR
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        in_suites = directory == testsuite_dir or testsuite_dir in directory.parents
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(Path(entry.path))
+                continue
+            name = entry.name.lower()
+            if name.endswith(CAPL_EXTENSIONS):
+                target = capl
+            elif in_suites and name.endswith('.xml'):
+                target = suites
+            else:
+                continue
+            try:
+                target.append((Path(entry.path), entry.stat()))
+            except OSError:
+                continue
+    return sorted(capl, key=lambda t: t[0]), sorted(suites, key=lambda t: t[0])
+
+
+def _content_changed(old, new) -> bool:
+    """A touched-but-identical file (same hash, same error state) is not a change."""
+    return (old.sha1, old.error) != (new.sha1, new.error)
+
+
+class WorkspaceIndex:
+    """
+    Parsed view of a GM_VIP_Automation tree.  ``capl_files`` and
+    ``suite_files`` map root-relative POSIX paths to their info objects, in
+    the same sorted order the tools have always processed files in.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.capl_files: dict[str, CaplFileInfo] = {}
+        self.suite_files: dict[str, SuiteFileInfo] = {}
+        self.reparsed = 0       # files (re)read by the last refresh()
+
+    @classmethod
+    def load(cls, root: Path, index_path: Path | None = None, persist: bool = True) -> 'WorkspaceIndex':
+        """Load the persisted index (if any), bring it up to date, and save it back."""
+        index = cls(root)
+        index_path = index_path or root / INDEX_FILENAME
+        previous = index._read(index_path) if persist else {}
+        index.refresh(previous)
+        if persist:
+            index.save(index_path)
+        return index
+
+    @staticmethod
+    def _version() -> str:
+        return hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+
+    def _read(self, index_path: Path) -> dict:
+        try:
+            data = json.loads(index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if data.get('version') != self._version() or data.get('root') != str(self.root):
+            return {}
+        return {
+            'capl': {rel: CaplFileInfo(**info) for rel, info in data.get('capl', {}).items()},
+            'suites': {rel: SuiteFileInfo(**info) for rel, info in data.get('suites', {}).items()},
+        }
+
+    def refresh(self, previous: dict | None = None):
+        """Rescan the tree, re-parsing only files whose size or mtime changed."""
+        previous = previous or {}
+        self.reparsed = 0
+        capl, suites = _scan_tree(self.root)
+        self.capl_files = self._update(capl, previous.get('capl', {}), parse_capl_file, CaplFileInfo)
+        self.suite_files = self._update(suites, previous.get('suites', {}), parse_suite_file, SuiteFileInfo)
+
+    def _update(self, found, previous, parse, info_type):
+        updated = {}
+        for path, st in found:
+            rel = path.relative_to(self.root).as_posix()
+            info = previous.get(rel)
+            if info is None or info.error or info.mtime_ns != st.st_mtime_ns or info.size != st.st_size:
+                self.reparsed += 1
+                try:
+                    info = parse(path.read_bytes(), st)
+                except OSError as exc:
+                    info = info_type(sha1='', mtime_ns=st.st_mtime_ns, size=st.st_size, error=str(exc))
+            updated[rel] = info
+        return updated
+
+    def update(self, paths) -> list[str]:
+        """
+        Re-stat just the given files (changed, created or deleted – e.g. from
+        file-system notifications) and re-parse the ones whose content
+        changed.  Returns the affected rels; paths that are not CAPL sources
+        or suite XMLs are ignored.
+        """
+        changed = []
+        testsuite_dir = self.root / TESTSUITE_DIR
+        for path in map(Path, paths):
+            try:
+                rel = path.relative_to(self.root).as_posix()
+            except ValueError:
+                continue
+            name = path.name.lower()
+            if name.endswith(CAPL_EXTENSIONS):
+                files, parse, info_type = self.capl_files, parse_capl_file, CaplFileInfo
+            elif name.endswith('.xml') and testsuite_dir in path.parents:
+                files, parse, info_type = self.suite_files, parse_suite_file, SuiteFileInfo
+            else:
+                continue
+            previous = files.get(rel)
+            try:
+                st = path.stat()
+                is_file = stat.S_ISREG(st.st_mode)
+            except OSError:
+                is_file = False
+            if not is_file:
+                if files.pop(rel, None) is not None:
+                    changed.append(rel)
+                continue
+            info = self._update([(path, st)], {rel: previous} if previous else {}, parse, info_type)[rel]
+            files[rel] = info
+            if previous is None:
+                changed.append(rel)
+                # keep the sorted order _scan_tree() produces
+                ordered = sorted(files.items(), key=lambda item: self.path(item[0]))
+                files.clear()
+                files.update(ordered)
+            elif _content_changed(previous, info):
+                changed.append(rel)
+        return changed
+
+    def rescan(self) -> list[str]:
+        """Walk the whole tree again (polling); returns the rels added, removed or changed."""
+        old_capl, old_suites = self.capl_files, self.suite_files
+        self.refresh({'capl': old_capl, 'suites': old_suites})
+        return sorted(
+            rel
+            for old, new in ((old_capl, self.capl_files), (old_suites, self.suite_files))
+            for rel in old.keys() | new.keys()
+            if rel not in old or rel not in new or _content_changed(old[rel], new[rel])
+        )
+
+    def save(self, index_path: Path):
+        data = {
+            'version': self._version(),
+            'root': str(self.root),
+            'capl': {rel: asdict(info) for rel, info in self.capl_files.items()},
+            'suites': {rel: asdict(info) for rel, info in self.suite_files.items()},
+        }
+        tmp = index_path.with_name(index_path.name + '.tmp')
+        try:
+            tmp.write_text(json.dumps(data), encoding='utf-8')
+            os.replace(tmp, index_path)
+        except OSError as exc:
+            print(f"WARNING: could not write workspace index {index_path}: {exc}", file=sys.stderr)
+
+    # ---- Queries ----
+
+    def path(self, rel: str) -> Path:
+        return self.root / rel
+
+    def testcase_definitions(self, extensions=CAPL_EXTENSIONS, first_wins: bool = False) -> dict[str, Path]:
+        """{testcase name: defining file} over files with the given extensions."""
+        defined: dict[str, Path] = {}
+        for rel, info in self.capl_files.items():
+            if not rel.lower().endswith(extensions):
+                continue
+            for name, _ in info.testcases:
+                if first_wins:
+                    defined.setdefault(name, self.path(rel))
+                else:
+                    defined[name] = self.path(rel)
+        return defined
+
+    def testcase_refs(self) -> dict[str, Path]:
+        """{<capltestcase> name: suite XML} over every parseable suite file (last reference wins)."""
+        refs: dict[str, Path] = {}
+        for rel, info in self.suite_files.items():
+            for name in info.refs:
+                refs[name] = self.path(rel)
+        return refs
+
+
+class IncludeGraph:
+    """
+    #include graph over an indexed tree.  Edges, transitive closures and
+    per-file symbol tables are memoised, so a library .cin shared by many
+    .can files is resolved once no matter how many units include it.
+    Cycles are tolerated (closures are computed breadth-first).
+    """
+    SYMBOL_KINDS = ('testcases', 'testfunctions', 'functions', 'variables')
+
+    def __init__(self, index: WorkspaceIndex):
+        self.index = index
+        self._edges: dict[str, list[tuple]] = {}
+        self._closures: dict[str, frozenset] = {}
+        self._symbols: dict[str, frozenset] = {}
+        self._testfunctions: dict[str, str] | None = None
+        self._includers: dict[str, list[str]] | None = None
+
+    def _raw_edges(self, rel: str) -> list[tuple]:
+        """Like edges(), but the target rel is kept even when no such file exists."""
+        if rel not in self._edges:
+            parent = self.index.path(rel).parent
+            edges = []
+            for name, line in self.index.capl_files[rel].includes:
+                resolved = (parent / name.replace('\\', os.sep).replace('/', os.sep)).resolve()
+                try:
+                    target = resolved.relative_to(self.index.root).as_posix()
+                except ValueError:
+                    target = None
+                edges.append((name, line, target))
+            self._edges[rel] = edges
+        return self._edges[rel]
+
+    def edges(self, rel: str) -> list[tuple]:
+        """[(include string, line, target rel or None when unresolved/outside the tree)]."""
+        files = self.index.capl_files
+        return [(name, line, target if target in files else None) for name, line, target in self._raw_edges(rel)]
+
+    def closure(self, rel: str) -> frozenset:
+        """Every file reachable from *rel* through #include (excluding *rel* itself)."""
+        if rel not in self._closures:
+            seen = set()
+            frontier = [rel]
+            while frontier:
+                current = frontier.pop()
+                for _, _, target in self.edges(current):
+                    if target and target not in seen and target != rel:
+                        seen.add(target)
+                        if target in self._closures:
+                            seen |= self._closures[target] - {rel}
+                        else:
+                            frontier.append(target)
+            self._closures[rel] = frozenset(seen)
+        return self._closures[rel]
+
+    def symbols(self, rel: str) -> frozenset:
+        """Names a file defines: testcases, testfunctions, functions and global variables."""
+        if rel not in self._symbols:
+            info = self.index.capl_files[rel]
+            names = set(info.variables)
+            for kind in ('testcases', 'testfunctions', 'functions'):
+                names.update(name for name, _ in getattr(info, kind))
+            self._symbols[rel] = frozenset(names)
+        return self._symbols[rel]
+
+    def visible_symbols(self, rel: str) -> set:
+        """Symbols defined by *rel* and everything it transitively includes."""
+        names = set(self.symbols(rel))
+        for other in self.closure(rel):
+            names |= self.symbols(other)
+        return names
+
+    def testfunction_owners(self) -> dict[str, str]:
+        """{testfunction name: defining file} over the whole tree."""
+        if self._testfunctions is None:
+            self._testfunctions = {}
+            for rel, info in self.index.capl_files.items():
+                for name, _ in info.testfunctions:
+                    self._testfunctions.setdefault(name, rel)
+        return self._testfunctions
+
+    def includers(self, rel: str) -> list[str]:
+        """Files with an #include that resolves to *rel* (whether or not *rel* exists)."""
+        if self._includers is None:
+            self._includers = {}
+            for other in self.index.capl_files:
+                for _, _, target in self._raw_edges(other):
+                    if target and other not in self._includers.setdefault(target, []):
+                        self._includers[target].append(other)
+        return self._includers.get(rel, [])
+
+    def dependents(self, rel: str) -> list[str]:
+        """Files that include *rel* directly or transitively (sorted)."""
+        seen = set()
+        frontier = [rel]
+        while frontier:
+            for other in self.includers(frontier.pop()):
+                if other not in seen and other != rel:
+                    seen.add(other)
+                    frontier.append(other)
+        return sorted(seen)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or refresh the GM VIP Automation workspace index")
+    parser.add_argument(
+        '--root',
+        type=Path,
+        default=Path(__file__).resolve().parent,
+        help="Root directory of GM_VIP_Automation (default: same folder as this script)",
+    )
+    parser.add_argument('--rebuild', action='store_true', help="Ignore the persisted index and re-parse every file")
+    args = parser.parse_args()
+    root: Path = args.root.resolve()
+    if not root.is_dir():
+        print(f"ERROR: root directory not found: {root}", file=sys.stderr)
+        return 1
+
+    if args.rebuild:
+        (root / INDEX_FILENAME).unlink(missing_ok=True)
+    index = WorkspaceIndex.load(root)
+    n_tc = sum(len(i.testcases) for i in index.capl_files.values())
+    n_tf = sum(len(i.testfunctions) for i in index.capl_files.values())
+    print(f"{len(index.capl_files)} CAPL file(s): {n_tc} testcase(s), {n_tf} testfunction(s)")
+    print(f"{len(index.suite_files)} suite XML(s): {sum(len(i.refs) for i in index.suite_files.values())} <capltestcase> reference(s)")
+    print(f"{index.reparsed} file(s) parsed, {len(index.capl_files) + len(index.suite_files) - index.reparsed} reused from {INDEX_FILENAME}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
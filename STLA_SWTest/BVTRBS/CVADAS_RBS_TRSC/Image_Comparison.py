@@ -13,6 +13,10 @@ import psutil
 import sys
 import shutil
 import json
+import sqlite3
+import threading
+import queue
+import cProfile
 from skimage.metrics import structural_similarity as ssim
 
 # --- Configuration Helper Functions ---
@@ -67,51 +71,103 @@ def create_side_by_side_comparison(master_frame, captured_frame, diff_percent):
 
     return comparison_image
 
-def compare_pixel_diff(frame1, frame2, **kwargs):
+def compare_pixel_diff(frame1, frame2, return_map=False, **kwargs):
     """
     Compares two frames using absolute pixel difference and thresholding.
-    Returns a percentage of difference.
+    Returns a percentage of difference (and the 0/255 change mask if return_map is set).
     """
-    if frame1 is None or frame2 is None: return 0
+    if frame1 is None or frame2 is None: return (0, None) if return_map else 0
     try:
         diff = cv2.absdiff(frame1, frame2)
         gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
         _, thresh = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
         non_zero_count = np.count_nonzero(thresh)
         total_pixels = thresh.shape[0] * thresh.shape[1]
-        if total_pixels == 0:
-            return 0
-        return (non_zero_count / total_pixels) * 100
+        percent = (non_zero_count / total_pixels) * 100 if total_pixels else 0
+        return (percent, thresh) if return_map else percent
     except cv2.error as e:
         logging.error(f"OpenCV error in compare_pixel_diff: {e}")
-        return 0
+        return (0, None) if return_map else 0
 
-def compare_ssim(frame1, frame2, **kwargs):
+def compare_ssim(frame1, frame2, return_map=False, **kwargs):
     """
     Compares two frames using the Structural Similarity Index (SSIM).
-    Returns a "dissimilarity" percentage.
+    Returns a "dissimilarity" percentage (and the per-pixel 1 - SSIM map if return_map is set).
     """
     if frame1 is None or frame2 is None:
-        return 0
+        return (0, None) if return_map else 0
     gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
     gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-    (score, _) = ssim(gray1, gray2, full=True)
+    (score, ssim_map) = ssim(gray1, gray2, full=True)
    # Return dissimilarity percentage
-    return (1 - score) * 100
+    percent = (1 - score) * 100
+    return (percent, 1 - ssim_map) if return_map else percent
 
-def compare_background_subtraction(frame, back_sub_model, **kwargs):
+def compare_background_subtraction(frame, back_sub_model, return_map=False, **kwargs):
     """
     Uses a background subtraction model to find foreground objects.
-    Returns the percentage of the frame that is foreground.
+    Returns the percentage of the frame that is foreground (and the 0/1 foreground mask if return_map is set).
     """
     if frame is None or back_sub_model is None:
-        return 0
+        return (0, None) if return_map else 0
     fg_mask = back_sub_model.apply(frame)
     non_zero_count = np.count_nonzero(fg_mask)
     total_pixels = fg_mask.shape[0] * fg_mask.shape[1]
-    if total_pixels == 0:
-        return 0
-    return (non_zero_count / total_pixels) * 100
+    percent = (non_zero_count / total_pixels) * 100 if total_pixels else 0
+    return (percent, (fg_mask > 0).view(np.uint8)) if return_map else percent
+
+def _tile_edges(h, w, grid):
+    """Pixel boundaries of a (cols, rows) tile grid over an h x w image."""
+    cols, rows = max(1, min(grid[0], w)), max(1, min(grid[1], h))
+    return np.linspace(0, h, rows + 1).astype(int), np.linspace(0, w, cols + 1).astype(int)
+
+def tile_change_scores(change_map, grid, full_scale=255.0):
+    """Reduces a per-pixel change map to a (rows, cols) array of per-tile difference percentages in one pass."""
+    ys, xs = _tile_edges(change_map.shape[0], change_map.shape[1], grid)
+    sums = np.add.reduceat(np.add.reduceat(change_map, ys[:-1], axis=0, dtype=np.float64), xs[:-1], axis=1)
+    return sums / np.outer(np.diff(ys), np.diff(xs)) / full_scale * 100
+
+_ignore_mask_cache = {}
+
+def _ignore_mask(shape, ignore_zones):
+    """Boolean mask of the ignore zones (x, y, w, h in ROI coordinates), cached per frame shape."""
+    key = (shape, tuple(ignore_zones))
+    mask = _ignore_mask_cache.get(key)
+    if mask is None:
+        mask = np.zeros(shape, dtype=bool)
+        for x, y, w, h in ignore_zones:
+            mask[y:y+h, x:x+w] = True
+        _ignore_mask_cache[key] = mask
+    return mask
+
+def compare_frames(method, frame1, frame2, back_sub_model=None, grid=None, ignore_zones=None):
+    """
+    Comparison engine used by the capture loop. Returns (diff_percent, tile_scores).
+    tile_scores is a (rows, cols) heatmap of per-tile difference percentages computed from the same
+    change map as diff_percent, so box drawing and per-tile thresholds need no further image processing.
+    Pixels inside ignore_zones (clocks, overlays, ...) count neither towards diff_percent nor the heatmap.
+    """
+    if method == 'pixel_diff':
+        percent, change_map = compare_pixel_diff(frame1, frame2, return_map=True)
+        full_scale = 255.0
+    elif method == 'ssim':
+        percent, change_map = compare_ssim(frame1, frame2, return_map=True)
+        full_scale = 1.0
+    elif method == 'background_subtraction':
+        percent, change_map = compare_background_subtraction(frame1, back_sub_model, return_map=True)
+        full_scale = 1.0
+    else:
+        logging.error(f"Unknown comparison method: {method}")
+        return 0, None
+    if change_map is None:
+        return percent, None
+    if ignore_zones:
+        mask = _ignore_mask(change_map.shape[:2], ignore_zones)
+        change_map[mask] = 0
+        valid_pixels = change_map.size - np.count_nonzero(mask)
+        percent = float(change_map.sum(dtype=np.float64)) / valid_pixels / full_scale * 100 if valid_pixels else 0
+    tile_scores = tile_change_scores(change_map, grid, full_scale) if grid else None
+    return percent, tile_scores
 
 def run_comparison_method(method, frame1, frame2, back_sub_model=None):
     """Router to call the selected comparison function."""
@@ -253,57 +309,682 @@ def compare_to_master_headless(camera_index, output_dir, threshold, method, conf
         if cap and cap.isOpened():
             cap.release()
 
-def export_media(detected_frames_paths, output_dir, export_format="gif", gif_duration_ms=200, video_fps=5):
-    """Exports detected frames as a GIF or video."""
-    if not detected_frames_paths:
-        logging.warning("No frames detected to export.")
-        return
-
-    if export_format == "gif":
-        gif_path = os.path.join(output_dir, "detected_changes.gif")
-        images = []
-        for img_path in detected_frames_paths:
-            try: images.append(imageio.imread(img_path))
-            except FileNotFoundError: logging.warning(f"Image file not found for GIF: {img_path}. Skipping.")
-            except Exception as e: logging.warning(f"Could not read image {img_path} for GIF: {e}. Skipping.")
-        if images:
-            try:
-                imageio.mimsave(gif_path, images, duration=gif_duration_ms / 1000.0)
-                logging.info(f"GIF saved: {gif_path}")
-            except Exception as e: logging.error(f"Failed to save GIF: {e}")
-        else: logging.warning("No valid images to create GIF.")
-    elif export_format == "video":
-        video_path = os.path.join(output_dir, "detected_changes.avi")
+class StreamingMediaExporter:
+    """
+    Streams detected frames into a GIF or video as they arrive instead of reading them back at exit.
+    Every frame is written unless a cap is requested: then at most max_frames frames are
+    written and frames closer than min_interval seconds (session time) to the previously
+    exported one are skipped.
+    """
+    def __init__(self, output_dir, export_format="gif", gif_duration_ms=200, video_fps=5, max_frames=0, min_interval=0.0):
+        self.output_dir = output_dir
+        self.export_format = export_format
+        self.gif_duration_ms = gif_duration_ms
+        self.video_fps = video_fps
+        self.max_frames = max_frames
+        self.min_interval = min_interval
+        self.frames_written = 0
+        self.frames_skipped = 0
+        self.path = None
+        self._writer = None
+        self._frame_size = None
+        self._last_elapsed = None
+        if export_format not in ("gif", "video"):
+            logging.warning(f"Unknown export format: {export_format}. Choose 'gif' or 'video'.")
+
+    def _open(self, frame):
+        h, w = frame.shape[:2]
+        self._frame_size = (w, h)
+        if self.export_format == "gif":
+            self.path = os.path.join(self.output_dir, "detected_changes.gif")
+            self._writer = imageio.get_writer(self.path, mode='I', duration=self.gif_duration_ms / 1000.0)
+        else:
+            self.path = os.path.join(self.output_dir, "detected_changes.avi")
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*'XVID'), self.video_fps, (w, h))
+
+    def add_frame(self, frame, elapsed=None):
+        """Writes one BGR frame, subject to the frame cap and temporal subsampling. Returns True if written."""
+        if frame is None or self.export_format not in ("gif", "video"):
+            return False
+        if (self.max_frames and self.frames_written >= self.max_frames) or \
+           (elapsed is not None and self._last_elapsed is not None and elapsed - self._last_elapsed < self.min_interval):
+            self.frames_skipped += 1
+            return False
         try:
-            if not detected_frames_paths:
-                return
-            first_frame_img = cv2.imread(detected_frames_paths[0])
-            if first_frame_img is None:
-                logging.error(f"Could not read first frame for video export: {detected_frames_paths[0]}")
-                return
-            height, width, _ = first_frame_img.shape
-            video_writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'XVID'), video_fps, (width, height))
-            for img_path in detected_frames_paths:
-                frame = cv2.imread(img_path)
-                if frame is not None: video_writer.write(frame)
-                else: logging.warning(f"Could not read frame {img_path} for video. Skipping.")
-            video_writer.release()
-            logging.info(f"Video saved: {video_path}")
+            if self._writer is None:
+                self._open(frame)
+            if (frame.shape[1], frame.shape[0]) != self._frame_size:
+                frame = cv2.resize(frame, self._frame_size)
+            if self.export_format == "gif":
+                self._writer.append_data(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            else:
+                self._writer.write(frame)
         except Exception as e:
-            logging.error(f"Failed to write video: {e}")
-    else:
-        logging.warning(f"Unknown export format: {export_format}. Choose 'gif' or 'video'.")
+            logging.warning(f"Could not add frame to {self.export_format} export: {e}. Skipping.")
+            return False
+        self.frames_written += 1
+        if elapsed is not None:
+            self._last_elapsed = elapsed
+        return True
+
+    def close(self):
+        """Finalises the output file."""
+        if self._writer is None:
+            if self.export_format in ("gif", "video"):
+                logging.warning("No frames detected to export.")
+            return
+        try:
+            if self.export_format == "gif": self._writer.close()
+            else: self._writer.release()
+            logging.info(f"{self.export_format.upper()} saved: {self.path} ({self.frames_written} frames, {self.frames_skipped} skipped by export cap)")
+        except Exception as e:
+            logging.error(f"Failed to save {self.export_format}: {e}")
+        self._writer = None
+
+_created_dirs = set()
+
+def _ensure_dir(path):
+    """Creates a directory once per session; later calls are a set lookup instead of a syscall."""
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
 
 def _save_quality_issue_frame(original_path, quality_base_dir, issue_name):
     """Helper function to save a frame to a specific quality issue subfolder."""
     issue_dir = os.path.join(quality_base_dir, issue_name)
     try:
-        os.makedirs(issue_dir, exist_ok=True)
+        _ensure_dir(issue_dir)
         shutil.copy2(original_path, os.path.join(issue_dir, os.path.basename(original_path)))
         logging.info(f"Frame classified as {issue_name} and copied: {os.path.basename(original_path)}")
     except Exception as e:
         logging.error(f"Could not copy frame to {issue_name} folder: {e}")
 
+# --- Raw Recording ---
+
+class SegmentedVideoRecorder:
+    """
+    Records the raw camera stream on a background thread.
+    Frames are queued by the capture loop and encoded by a worker, so codec cost never
+    stalls capture. With segment_seconds > 0 the recording is split into numbered segments
+    (the oldest are deleted beyond max_segments). A sidecar CSV maps every frame to its
+    segment, wall-clock timestamp and diff score so tools can seek straight to a detection.
+    """
+    INDEX_HEADER = ["Frame", "Segment", "Segment Frame", "Timestamp", "Session Elapsed (s)", "Difference (%)"]
+
+    def __init__(self, output_dir, codec, fps, frame_size, base_name="full_recorded_video", segment_seconds=0, max_segments=0, queue_size=256):
+        self.output_dir = output_dir
+        self.codec = codec
+        self.fps = fps
+        self.frame_size = frame_size
+        self.base_name = base_name
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.segment_paths = []
+        self._writer = None
+        self._segment_start = None
+        self._segment_frame = 0
+        self._index_file = open(os.path.join(output_dir, f"{base_name}_index.csv"), 'w', newline='')
+        self._index_writer = csv.writer(self._index_file)
+        self._index_writer.writerow(self.INDEX_HEADER)
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Pool of at most queue_size frame buffers, recycled by the worker (copy-on-retain without per-frame allocation).
+        self._free_buffers = queue.Queue()
+        self._buffers_allocated = 0
+        self._thread = threading.Thread(target=self._run, name="raw-recorder", daemon=True)
+        self._thread.start()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def write(self, frame, timestamp=None, elapsed=None, diff_percent=None):
+        """
+        Copies the frame into a pooled buffer and queues it for encoding, so the caller may reuse
+        its own buffer immediately. Drops (and counts) the frame if the encoder is a full queue behind.
+        """
+        try:
+            buf = self._free_buffers.get_nowait()
+        except queue.Empty:
+            if self._buffers_allocated >= self._queue.maxsize:
+                self.frames_dropped += 1
+                return
+            buf = None
+            self._buffers_allocated += 1
+        if buf is None or buf.shape != frame.shape:
+            buf = np.empty_like(frame)
+        np.copyto(buf, frame)
+        self._queue.put_nowait((buf, timestamp or time.time(), elapsed, diff_percent))
+
+    def _open_segment(self, timestamp):
+        if self._writer is not None:
+            self._writer.release()
+        suffix = f"_{len(self.segment_paths):03d}" if self.segment_seconds else ""
+        path = os.path.join(self.output_dir, f"{self.base_name}{suffix}.avi")
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.codec), self.fps, self.frame_size)
+        self.segment_paths.append(path)
+        self._segment_start = timestamp
+        self._segment_frame = 0
+        if self.max_segments and len(self.segment_paths) > self.max_segments:
+            oldest = self.segment_paths[-self.max_segments - 1]
+            try:
+                os.remove(oldest)
+                logging.info(f"Rotated out old recording segment: {oldest}")
+            except OSError as e:
+                logging.warning(f"Could not remove old recording segment {oldest}: {e}")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, timestamp, elapsed, diff_percent = item
+            try:
+                if self._writer is None or (self.segment_seconds and timestamp - self._segment_start >= self.segment_seconds):
+                    self._open_segment(timestamp)
+                self._writer.write(frame)
+                self._index_writer.writerow([
+                    self.frames_written, len(self.segment_paths) - 1, self._segment_frame,
+                    datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S_%f')[:-3],
+                    f"{elapsed:.3f}" if elapsed is not None else "",
+                    f"{diff_percent:.2f}" if diff_percent is not None else "",
+                ])
+                self.frames_written += 1
+                self._segment_frame += 1
+            except Exception as e:
+                logging.error(f"Raw recorder failed to write frame: {e}")
+            self._free_buffers.put(frame)
+
+    def release(self):
+        """Drains the queue, stops the encoder thread and closes the current segment and index."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if not self._index_file.closed:
+            self._index_file.close()
+            logging.info(f"Raw recording: {self.frames_written} frames in {len(self.segment_paths)} segment(s), {self.frames_dropped} dropped.")
+
+# --- Detection Event Logging ---
+
+class DetectionLogWriter:
+    """
+    Buffered writer for detection events.
+    Rows are kept in memory and flushed every flush_interval seconds (or when max_buffered
+    rows are pending) and on close, so the capture thread never opens/closes files per frame.
+    detection_log.csv is always written; 'jsonl' or 'sqlite' adds a structured sink that also
+    receives non-change events (distortion, screen transitions, ...).
+    """
+    CSV_HEADER = ["Timestamp", "Session Elapsed (s)", "Difference (%)", "Method", "Saved Frame", "Quality Issues"]
+    SCREEN_CSV_HEADER = ["Timestamp", "Session Elapsed (s)", "From Screen", "To Screen", "Hash Distance"]
+
+    def __init__(self, output_dir, structured_sink="none", flush_interval=2.0, max_buffered=256):
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._pending = []
+        self._last_flush = time.time()
+        self._jsonl_file = None
+        self._db = None
+        self._screen_csv_file = None
+        self._screen_csv_writer = None
+        self.output_dir = output_dir
+
+        self.csv_path = os.path.join(output_dir, "detection_log.csv")
+        self._csv_file = open(self.csv_path, 'w', newline='')
+        self._csv_writer = csv.writer(self._csv_file)
+        self._csv_writer.writerow(self.CSV_HEADER)
+
+        if structured_sink == "jsonl":
+            self._jsonl_file = open(os.path.join(output_dir, "detection_log.jsonl"), 'w')
+        elif structured_sink == "sqlite":
+            self._db = sqlite3.connect(os.path.join(output_dir, "detection_log.sqlite"))
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "timestamp TEXT, elapsed REAL, event TEXT, diff_percent REAL, "
+                "method TEXT, saved_frame TEXT, quality_issues TEXT, details TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp)")
+            self._db.commit()
+        elif structured_sink != "none":
+            logging.warning(f"Unknown detection log sink: {structured_sink}. Only CSV will be written.")
+
+    def log_detection(self, ts_str, elapsed, diff_percent, method, saved_frame, quality_issues):
+        """Queues a change detection row (written to the CSV and the structured sink)."""
+        self.log_event("change", ts_str, elapsed, diff_percent=diff_percent, method=method,
+                       saved_frame=saved_frame, quality_issues=quality_issues)
+
+    def log_event(self, event, ts_str, elapsed, diff_percent=None, method=None, saved_frame=None, quality_issues=None, **details):
+        """Queues a generic event. Only 'change' events are written to the CSV."""
+        self._pending.append({
+            "timestamp": ts_str, "elapsed": round(elapsed, 3), "event": event,
+            "diff_percent": diff_percent, "method": method, "saved_frame": saved_frame,
+            "quality_issues": list(quality_issues or []), "details": details,
+        })
+        if len(self._pending) >= self.max_buffered:
+            self.flush()
+
+    def pending_rows(self):
+        return len(self._pending)
+
+    def maybe_flush(self):
+        """Flushes pending rows if the flush interval has elapsed. Cheap enough to call every frame."""
+        if self._pending and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes all pending rows to every sink."""
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        try:
+            for r in rows:
+                if r["event"] == "change":
+                    self._csv_writer.writerow([r["timestamp"], f"{r['elapsed']:.2f}", f"{r['diff_percent']:.2f}",
+                                              r["method"], r["saved_frame"], ", ".join(r["quality_issues"]) or "None"])
+                elif r["event"] == "screen_transition":
+                    if self._screen_csv_writer is None:
+                        self._screen_csv_file = open(os.path.join(self.output_dir, "screen_transitions.csv"), 'w', newline='')
+                        self._screen_csv_writer = csv.writer(self._screen_csv_file)
+                        self._screen_csv_writer.writerow(self.SCREEN_CSV_HEADER)
+                    d = r["details"]
+                    self._screen_csv_writer.writerow([r["timestamp"], f"{r['elapsed']:.2f}", d.get("from_screen") or "unknown",
+                                                      d.get("to_screen") or "unknown", d.get("distance")])
+            self._csv_file.flush()
+            if self._screen_csv_file: self._screen_csv_file.flush()
+            if self._jsonl_file:
+                self._jsonl_file.writelines(json.dumps(r) + "\n" for r in rows)
+                self._jsonl_file.flush()
+            if self._db:
+                self._db.executemany(
+                    "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(r["timestamp"], r["elapsed"], r["event"], r["diff_percent"], r["method"], r["saved_frame"],
+                      ", ".join(r["quality_issues"]), json.dumps(r["details"]) if r["details"] else None) for r in rows]
+                )
+                self._db.commit()
+        except Exception as e:
+            logging.error(f"Failed to flush detection log: {e}")
+
+    def close(self):
+        """Flushes remaining rows and closes all sinks."""
+        self.flush()
+        self._csv_file.close()
+        if self._screen_csv_file: self._screen_csv_file.close()
+        if self._jsonl_file: self._jsonl_file.close()
+        if self._db: self._db.close()
+
+# --- Change Episode Clustering ---
+
+class ChangeEpisodeTracker:
+    """
+    Coalesces consecutive over-threshold frames into change episodes.
+    An episode stays open until no over-threshold frame has been seen for gap_seconds.
+    Only the peak frame is kept in memory (as the representative key frame); every
+    episode frame is streamed into a short per-episode clip if clip_dir is set.
+    """
+    def __init__(self, gap_seconds, clip_dir=None, clip_fps=10, clip_codec="XVID", max_clip_frames=300):
+        self.gap_seconds = gap_seconds
+        self.clip_dir = clip_dir
+        self.clip_fps = clip_fps
+        self.clip_codec = clip_codec
+        self.max_clip_frames = max_clip_frames
+        self.current = None
+
+    def update(self, timestamp, elapsed, diff_percent, frame, cropped_frame, ref_frame, quality_stats=None, tile_scores=None):
+        """Adds an over-threshold frame, opening a new episode if none is active."""
+        ep = self.current
+        if ep is None:
+            ts_str = timestamp.strftime('%Y%m%d_%H%M%S_%f')[:-3]
+            ep = self.current = {
+                "id": f"episode_{ts_str}", "start": timestamp, "start_elapsed": elapsed,
+                "peak_diff": -1.0, "frame_count": 0, "clip_path": None, "clip_writer": None,
+            }
+            if self.clip_dir:
+                _ensure_dir(self.clip_dir)
+                h, w = frame.shape[:2]
+                ep["clip_path"] = os.path.join(self.clip_dir, f"{ep['id']}.avi")
+                ep["clip_writer"] = cv2.VideoWriter(ep["clip_path"], cv2.VideoWriter_fourcc(*self.clip_codec), self.clip_fps, (w, h))
+        ep["end"], ep["end_elapsed"], ep["last_seen"] = timestamp, elapsed, time.time()
+        ep["frame_count"] += 1
+        if ep["clip_writer"] is not None and ep["frame_count"] <= self.max_clip_frames:
+            ep["clip_writer"].write(frame)
+        if diff_percent > ep["peak_diff"]:
+            # Copy-on-retain: only the peak frame of the episode outlives this iteration.
+            ep["peak_diff"], ep["peak_time"], ep["peak_elapsed"] = diff_percent, timestamp, elapsed
+            ep["peak_frame"] = frame.copy()
+            ep["peak_cropped"] = cropped_frame.copy()
+            ep["peak_ref"] = ref_frame.copy() if ref_frame is not None else None
+            ep["peak_stats"] = quality_stats
+            ep["peak_tiles"] = tile_scores
+
+    def poll(self):
+        """Returns the active episode if its gap has expired (closing it), else None."""
+        if self.current is not None and time.time() - self.current["last_seen"] > self.gap_seconds:
+            return self.close()
+        return None
+
+    def close(self):
+        """Closes and returns the active episode, or None if there is none."""
+        ep, self.current = self.current, None
+        if ep and ep["clip_writer"] is not None:
+            ep["clip_writer"].release()
+            ep["clip_writer"] = None
+        return ep
+
+def save_change_episode(episode, args, detected_frames_output_dir, quality_issues_base_dir, changes_boxed_output_dir, detection_log, media_exporter=None):
+    """Writes the key frames of a closed episode, runs quality checks on its peak and logs it. Returns the saved frame path."""
+    ts_str = episode["peak_time"].strftime('%Y%m%d_%H%M%S_%f')[:-3]
+    filename = f"change_{ts_str}.jpg"
+    save_path = os.path.join(detected_frames_output_dir, filename)
+    cv2.imwrite(save_path, episode["peak_frame"]) #Save the original, full-size frame for context
+    if media_exporter:
+        media_exporter.add_frame(episode["peak_frame"], episode["peak_elapsed"])
+    duration = (episode["end"] - episode["start"]).total_seconds()
+    logging.info(f"CHANGE EPISODE {episode['id']}: {episode['frame_count']} frames over {duration:.2f}s, "
+                 f"peak {episode['peak_diff']:.2f}%. Saved key frame {filename}")
+
+    if episode["peak_ref"] is not None:
+        comparison_image = create_side_by_side_comparison(episode["peak_ref"], episode["peak_cropped"], episode["peak_diff"])
+        comparison_filename = f"change_{ts_str}_comparison.jpg"
+        cv2.imwrite(os.path.join(detected_frames_output_dir, comparison_filename), comparison_image)
+        logging.info(f"Saved side-by-side comparison image: {comparison_filename}")
+
+    quality_issues = []
+    if args.enable_lighting_check:
+        quality_issues = check_lighting_and_color(episode["peak_cropped"], args.brightness_dark_thresh, args.brightness_bright_thresh, args.black_screen_std_dev_thresh, quality_issues_base_dir, save_path, True, episode["peak_stats"])
+
+    if args.draw_change_boxes:
+        draw_change_rectangles(episode["peak_cropped"], episode["peak_ref"], args.min_change_area, changes_boxed_output_dir, save_path, True,
+                               episode["peak_tiles"], args.tile_threshold or args.threshold)
+
+    detection_log.log_detection(ts_str, episode["peak_elapsed"], episode["peak_diff"], args.compare_method, save_path, quality_issues)
+    detection_log.log_event(
+        "episode", episode["start"].strftime('%Y%m%d_%H%M%S_%f')[:-3], episode["start_elapsed"],
+        diff_percent=episode["peak_diff"], method=args.compare_method, saved_frame=save_path, quality_issues=quality_issues,
+        end=episode["end"].strftime('%Y%m%d_%H%M%S_%f')[:-3], duration_s=round(duration, 3),
+        frame_count=episode["frame_count"], clip=episode["clip_path"],
+        tile_scores=np.round(episode["peak_tiles"], 2).tolist() if episode["peak_tiles"] is not None else None,
+    )
+    return save_path
+
+# --- Capture Backend ---
+
+CAPTURE_BACKENDS = {
+    "any": cv2.CAP_ANY, "dshow": cv2.CAP_DSHOW, "msmf": cv2.CAP_MSMF,
+    "v4l2": cv2.CAP_V4L2, "gstreamer": cv2.CAP_GSTREAMER, "ffmpeg": cv2.CAP_FFMPEG,
+}
+
+class BufferedCapture:
+    """
+    cv2.VideoCapture wrapper that decodes into a ring of preallocated, reused frame buffers.
+    read() fills the next ring slot via cap.read(image=buf), so a returned frame stays valid
+    for ring_size - 1 further reads. Anything kept longer must be copied (see retain_frame).
+    Optionally selects a capture API and requests hardware-accelerated decoding.
+    """
+    def __init__(self, camera_index, backend="any", hw_accel=False, ring_size=3):
+        api = CAPTURE_BACKENDS.get(backend, cv2.CAP_ANY)
+        if hw_accel and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            self.cap = cv2.VideoCapture(camera_index, api, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        else:
+            if hw_accel:
+                logging.warning("This OpenCV build does not support hardware-accelerated capture. Using software decoding.")
+            self.cap = cv2.VideoCapture(camera_index, api)
+        self._ring = [None] * max(2, ring_size)
+        self._slot = 0
+
+    def read(self):
+        """Reads the next frame into the ring. Returns (ret, frame) like cv2.VideoCapture.read()."""
+        buf = self._ring[self._slot]
+        ret, frame = self.cap.read(buf) if buf is not None else self.cap.read()
+        if ret and frame is not None:
+            # First use of a slot (or a resolution change) adopts the array OpenCV allocated.
+            self._ring[self._slot] = frame
+            self._slot = (self._slot + 1) % len(self._ring)
+        return ret, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+def retain_frame(src, dst=None):
+    """Copy-on-retain: copies src into dst when its shape/dtype match (no allocation), else returns a new copy."""
+    if dst is None or dst.shape != src.shape or dst.dtype != src.dtype:
+        return src.copy()
+    np.copyto(dst, src)
+    return dst
+
+# --- Reference Screen Recognition ---
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def perceptual_hash(frame):
+    """64-bit DCT perceptual hash (pHash) of a frame, returned as 8 packed bytes."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8].flatten()
+    return np.packbits(low_freq > np.median(low_freq[1:]))
+
+def _screen_thumbnail(frame):
+    """Downscaled, normalised grayscale feature used to break hash ties between similar screens."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32).flatten() / 255.0
+
+class ReferenceScreenIndex:
+    """
+    Library of known HMI screens (park assist views, warnings, menus, ...) for state recognition.
+    Each reference image in the library directory is stored with its perceptual hash and a
+    downscaled thumbnail; a live frame is classified against all references at once with a
+    vectorised Hamming distance. The file name (without extension) is the screen name.
+    The index is cached in the library directory and rebuilt when any reference changes.
+    """
+    INDEX_FILE = "reference_index.npz"
+    IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, names=(), hashes=None, thumbs=None, max_distance=10):
+        self.names = list(names)
+        self.hashes = hashes if hashes is not None else np.zeros((0, 8), dtype=np.uint8)
+        self.thumbs = thumbs if thumbs is not None else np.zeros((0, 256), dtype=np.float32)
+        self.max_distance = max_distance
+
+    def add(self, name, image):
+        """Adds (or replaces) a reference screen."""
+        if name in self.names:
+            i = self.names.index(name)
+            self.hashes[i], self.thumbs[i] = perceptual_hash(image), _screen_thumbnail(image)
+            return
+        self.names.append(name)
+        self.hashes = np.vstack([self.hashes, perceptual_hash(image)])
+        self.thumbs = np.vstack([self.thumbs, _screen_thumbnail(image)])
+
+    @classmethod
+    def load_or_build(cls, library_dir, max_distance=10):
+        """Loads the cached index if it matches the reference images on disk, otherwise rebuilds and saves it."""
+        files = sorted(f for f in os.listdir(library_dir) if f.lower().endswith(cls.IMAGE_EXTS))
+        signature = json.dumps([(f, os.path.getmtime(os.path.join(library_dir, f))) for f in files])
+        index_path = os.path.join(library_dir, cls.INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                cached = np.load(index_path)
+                if str(cached["signature"]) == signature:
+                    return cls(cached["names"].tolist(), cached["hashes"], cached["thumbs"], max_distance)
+            except Exception as e:
+                logging.warning(f"Reference screen index cache unreadable, rebuilding: {e}")
+        index = cls(max_distance=max_distance)
+        for f in files:
+            image = cv2.imread(os.path.join(library_dir, f))
+            if image is None:
+                logging.warning(f"Could not read reference screen {f}. Skipping.")
+                continue
+            index.add(os.path.splitext(f)[0], image)
+        try:
+            np.savez(index_path, names=np.array(index.names), hashes=index.hashes, thumbs=index.thumbs, signature=signature)
+        except OSError as e:
+            logging.warning(f"Could not cache reference screen index: {e}")
+        logging.info(f"Built reference screen index with {len(index.names)} screens from {library_dir}")
+        return index
+
+    def classify(self, frame):
+        """Returns (screen_name, hash_distance); screen_name is None if no reference is within max_distance."""
+        if not self.names:
+            return None, None
+        distances = _POPCOUNT[np.bitwise_xor(self.hashes, perceptual_hash(frame))].sum(axis=1, dtype=np.int32)
+        best = int(distances.min())
+        if best > self.max_distance:
+            return None, best
+        candidates = np.flatnonzero(distances == best)
+        if len(candidates) > 1:
+            thumb = _screen_thumbnail(frame)
+            candidates = candidates[[np.abs(self.thumbs[candidates] - thumb).mean(axis=1).argmin()]]
+        return self.names[candidates[0]], best
+
+class ScreenTransitionTracker:
+    """Debounces per-frame screen classifications; a new screen is reported after stable_frames consecutive matches."""
+    def __init__(self, stable_frames=3):
+        self.stable_frames = max(1, stable_frames)
+        self.current = None
+        self._candidate = None
+        self._count = 0
+
+    def update(self, screen_name):
+        """Returns (previous_screen, new_screen) on a confirmed transition, else None."""
+        if screen_name == self.current:
+            self._candidate, self._count = None, 0
+            return None
+        if screen_name != self._candidate:
+            self._candidate, self._count = screen_name, 0
+        self._count += 1
+        if self._count >= self.stable_frames:
+            previous, self.current = self.current, screen_name
+            self._candidate, self._count = None, 0
+            return previous, screen_name
+        return None
+
+# --- Performance Telemetry ---
+
+class PerfTelemetry:
+    """
+    Per-stage latency accounting for the capture loop.
+    lap(stage) charges the time since the previous lap to that stage; end_frame() commits the
+    frame's stage times to fixed-bucket histograms. Every interval seconds a snapshot (per-stage
+    latency, achieved vs requested FPS, queue depths, drop counters) is appended to a JSON-lines
+    metrics file; summary() logs the whole session at exit.
+    """
+    BUCKETS_MS = (1, 2, 5, 10, 20, 33, 50, 100, 200, 500, 1000)
+
+    def __init__(self, metrics_path, requested_fps, interval=10.0, gauges=None):
+        self.metrics_path = metrics_path
+        self.requested_fps = requested_fps
+        self.interval = interval
+        self.gauges = gauges or {}
+        self.counters = {}
+        self._session = {}
+        self._window = {}
+        self._frame = {}
+        self._session_start = self._window_start = self._mark = time.perf_counter()
+        self._session_frames = self._window_frames = 0
+
+    def begin_frame(self):
+        self._mark = time.perf_counter()
+        self._frame.clear()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self._frame[stage] = self._frame.get(stage, 0.0) + (now - self._mark) * 1000.0
+        self._mark = now
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def _new_stage(self):
+        return {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "hist": [0] * (len(self.BUCKETS_MS) + 1)}
+
+    def _add(self, table, stage, ms):
+        st = table.get(stage)
+        if st is None:
+            st = table[stage] = self._new_stage()
+        st["count"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        bucket = 0
+        while bucket < len(self.BUCKETS_MS) and ms > self.BUCKETS_MS[bucket]:
+            bucket += 1
+        st["hist"][bucket] += 1
+
+    def end_frame(self):
+        """Commits the current frame and writes a snapshot when the interval has elapsed."""
+        self._frame["frame"] = sum(self._frame.values())
+        for stage, ms in self._frame.items():
+            self._add(self._session, stage, ms)
+            self._add(self._window, stage, ms)
+        self._session_frames += 1
+        self._window_frames += 1
+        if time.perf_counter() - self._window_start >= self.interval:
+            self.write_snapshot()
+
+    def _percentile(self, st, q):
+        """Upper bucket bound containing the q-th percentile."""
+        target, seen = q * st["count"], 0
+        for i, n in enumerate(st["hist"]):
+            seen += n
+            if seen >= target:
+                return self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else st["max_ms"]
+        return st["max_ms"]
+
+    def _stage_report(self, table):
+        return {stage: {"count": st["count"], "mean_ms": round(st["total_ms"] / st["count"], 3),
+                        "p50_ms": self._percentile(st, 0.5), "p95_ms": self._percentile(st, 0.95),
+                        "max_ms": round(st["max_ms"], 3), "hist": st["hist"]}
+                for stage, st in table.items() if st["count"]}
+
+    def _gauge_values(self):
+        values = {}
+        for name, fn in self.gauges.items():
+            try: values[name] = fn()
+            except Exception: values[name] = None
+        return values
+
+    def write_snapshot(self, summary=False):
+        now = time.perf_counter()
+        span = now - (self._session_start if summary else self._window_start)
+        frames = self._session_frames if summary else self._window_frames
+        record = {
+            "time": datetime.now().isoformat(timespec='milliseconds'), "summary": summary,
+            "window_s": round(span, 3), "frames": frames,
+            "achieved_fps": round(frames / span, 2) if span > 0 else 0.0, "requested_fps": self.requested_fps,
+            "stages": self._stage_report(self._session if summary else self._window),
+            "counters": dict(self.counters), "gauges": self._gauge_values(),
+        }
+        try:
+            with open(self.metrics_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not write performance metrics: {e}")
+        self._window = {}
+        self._window_start = now
+        self._window_frames = 0
+        return record
+
+    def summary(self):
+        """Writes the session-wide snapshot and logs a per-stage summary."""
+        if not self._session_frames:
+            return
+        record = self.write_snapshot(summary=True)
+        logging.info(f"Performance: {record['achieved_fps']:.2f} FPS achieved vs {self.requested_fps:.2f} requested over {record['frames']} frames.")
+        for stage, st in sorted(record["stages"].items(), key=lambda kv: -kv[1]["mean_ms"]):
+            logging.info(f"  {stage:<10} mean {st['mean_ms']:.2f} ms, p95 <= {st['p95_ms']} ms, max {st['max_ms']:.2f} ms")
+        if record["counters"] or record["gauges"]:
+            logging.info(f"  counters {record['counters']}, gauges {record['gauges']}")
+
 # --- Core Logic and Checks ---
 
 def find_available_camera(max_indices_to_check=5):
@@ -331,21 +1012,57 @@ def handle_script_failure(message, instance_lock_obj, pid_file_path_to_clean, ca
     logging.info(f"--- Application instance PID {os.getpid()} exiting with FAILURE STATUS ---")
     sys.exit(1)
 
-def check_frame_distortion(frame, black_thresh, edge_margin_factor, solid_area_thresh, std_dev_thresh, output_dir_for_tuning=None, save_tuning_frames=True, current_filename_base="distorted"):
-    """Checks for basic frame distortion like large solid/black bars at edges."""
+class FrameQualityStats:
+    """
+    Fused quality kernel: converts a frame to grayscale once and builds integral images of
+    the intensity, squared intensity and 'black' mask. Mean, std and dark fraction of any
+    rectangle (edge bars, full frame) are then O(1) lookups.
+    """
+    def __init__(self, frame, black_thresh=None):
+        self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        self.h, self.w = self.gray.shape[:2]
+        self.black_thresh = black_thresh
+        self._sum, self._sqsum = cv2.integral2(self.gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        self._black = None
+        if black_thresh is not None:
+            self._black = cv2.integral((self.gray < black_thresh).view(np.uint8))
+
+    @staticmethod
+    def _rect_sum(ii, y0, y1, x0, x1):
+        return ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]
+
+    def region(self, y0, y1, x0, x1):
+        """Returns (pixel_count, mean, std, dark_fraction) for gray[y0:y1, x0:x1]."""
+        n = (y1 - y0) * (x1 - x0)
+        if n <= 0:
+            return 0, 0.0, 0.0, 0.0
+        mean = self._rect_sum(self._sum, y0, y1, x0, x1) / n
+        var = self._rect_sum(self._sqsum, y0, y1, x0, x1) / n - mean * mean
+        dark = self._rect_sum(self._black, y0, y1, x0, x1) / n if self._black is not None else 0.0
+        return n, mean, float(np.sqrt(max(var, 0.0))), dark
+
+    def full(self):
+        """Statistics over the whole frame."""
+        return self.region(0, self.h, 0, self.w)
+
+    def edges(self, edge_margin_factor):
+        """Statistics of the top/bottom/left/right edge bars."""
+        h, w = self.h, self.w
+        margin_h, margin_w = int(h * edge_margin_factor), int(w * edge_margin_factor)
+        return {
+            "top": self.region(0, margin_h, 0, w), "bottom": self.region(h - margin_h, h, 0, w),
+            "left": self.region(0, h, 0, margin_w), "right": self.region(0, h, w - margin_w, w),
+        }
+
+def check_frame_distortion(frame, black_thresh, edge_margin_factor, solid_area_thresh, std_dev_thresh, output_dir_for_tuning=None, save_tuning_frames=True, current_filename_base="distorted", stats=None):
+    """Checks for basic frame distortion like large solid/black bars at edges. Reuses precomputed FrameQualityStats if given."""
     if frame is None:
         return True
-    h, w = frame.shape[:2]
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    margin_h, margin_w = int(h * edge_margin_factor), int(w * edge_margin_factor)
-    regions_to_check = {
-        "top": gray_frame[0:margin_h, :], "bottom": gray_frame[h - margin_h:h, :],
-        "left": gray_frame[:, 0:margin_w], "right": gray_frame[:, w - margin_w:w]
-    }
-    for name, region in regions_to_check.items():
-        if region.size == 0: continue
-        dark_pixels = np.sum(region < black_thresh)
-        if (dark_pixels / region.size) >= solid_area_thresh and np.std(region) < std_dev_thresh:
+    if stats is None or stats.black_thresh != black_thresh:
+        stats = FrameQualityStats(frame, black_thresh)
+    for name, (n, _, std, dark_fraction) in stats.edges(edge_margin_factor).items():
+        if n == 0: continue
+        if dark_fraction >= solid_area_thresh and std < std_dev_thresh:
             logging.warning(f"Distortion suspected: Solid/dark bar detected in '{name}' region.")
             if save_tuning_frames and output_dir_for_tuning:
                 try:
@@ -359,42 +1076,98 @@ def check_frame_distortion(frame, black_thresh, edge_margin_factor, solid_area_t
             return True
     return False
 
-def check_lighting_and_color(frame, dark_thresh, bright_thresh, black_screen_std_dev, output_dir_quality, original_frame_path, save_issues=False):
-    """Checks for overall brightness issues and saves problematic frames."""
+class DistortionMonitor:
+    """
+    Non-blocking distortion state machine for the capture loop.
+    The first distorted frame opens a distortion episode; it ends once recovery_frames
+    consecutive clean frames have been seen. Capture keeps running the whole time, so the
+    episode start/end are taken from frame timestamps instead of fixed sleeps.
+    """
+    def __init__(self, recovery_frames=3):
+        self.recovery_frames = max(1, recovery_frames)
+        self.active = False
+        self.episode = None
+        self._clean_streak = 0
+
+    def update(self, distorted, elapsed):
+        """Feeds the distortion result of one frame. Returns 'start', 'recovered' or None."""
+        if distorted:
+            self._clean_streak = 0
+            started = not self.active
+            if started:
+                self.active = True
+                self.episode = {"start": datetime.now(), "start_elapsed": elapsed, "frames": 0, "distorted_frames": 0}
+            self.episode["frames"] += 1
+            self.episode["distorted_frames"] += 1
+            return "start" if started else None
+        if not self.active:
+            return None
+        self.episode["frames"] += 1
+        self._clean_streak += 1
+        if self._clean_streak == 1:
+            self.episode["end"], self.episode["end_elapsed"] = datetime.now(), elapsed
+        if self._clean_streak >= self.recovery_frames:
+            self.active = False
+            self._clean_streak = 0
+            return "recovered"
+        return None
+
+    def active_duration(self, elapsed):
+        """Seconds since the active episode started (0 if none)."""
+        return elapsed - self.episode["start_elapsed"] if self.active else 0.0
+
+def check_lighting_and_color(frame, dark_thresh, bright_thresh, black_screen_std_dev, output_dir_quality, original_frame_path, save_issues=False, stats=None):
+    """Checks for overall brightness issues and saves problematic frames. Reuses precomputed FrameQualityStats if given."""
     if frame is None: return ["frame_none"]
     issues = []
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    mean_brightness = np.mean(gray_frame)
+    if stats is None:
+        stats = FrameQualityStats(frame)
+    _, mean_brightness, std_brightness, _ = stats.full()
 
-    if mean_brightness < (dark_thresh / 2) and np.std(gray_frame) < black_screen_std_dev:
+    if mean_brightness < (dark_thresh / 2) and std_brightness < black_screen_std_dev:
         issues.append("black_screen")
         if save_issues: _save_quality_issue_frame(original_frame_path, output_dir_quality, "black_screen")
     elif mean_brightness < dark_thresh:
         issues.append("too_dark")
-        if save_issues: _save_quality_issue_frame(original_path, output_dir_quality, "too_dark")
+        if save_issues: _save_quality_issue_frame(original_frame_path, output_dir_quality, "too_dark")
     elif mean_brightness > bright_thresh:
         issues.append("too_bright")
         if save_issues: _save_quality_issue_frame(original_frame_path, output_dir_quality, "too_bright")
     return issues
 
-def draw_change_rectangles(original_frame, prev_frame_for_diff, min_contour_area, output_dir_changes_boxed, original_frame_path_to_copy, save_boxed_frames=False):
-    """Draws green rectangles around areas of significant change."""
-    if original_frame is None or prev_frame_for_diff is None: return original_frame
+def change_boxes_from_tiles(tile_scores, frame_shape, tile_threshold, min_area=0):
+    """Merges adjacent tiles above tile_threshold into (x, y, w, h) boxes using the per-tile heatmap only."""
+    ys, xs = _tile_edges(frame_shape[0], frame_shape[1], (tile_scores.shape[1], tile_scores.shape[0]))
+    hot = (tile_scores > tile_threshold).astype(np.uint8)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(hot, connectivity=8)
+    changed_pixels = tile_scores / 100 * np.outer(np.diff(ys), np.diff(xs))
+    boxes = []
+    for i in range(1, num_labels):
+        tx, ty, tw, th = stats[i][:4]
+        if changed_pixels[labels == i].sum() > min_area:
+            boxes.append((int(xs[tx]), int(ys[ty]), int(xs[tx + tw] - xs[tx]), int(ys[ty + th] - ys[ty])))
+    return boxes
+
+def draw_change_rectangles(original_frame, prev_frame_for_diff, min_contour_area, output_dir_changes_boxed, original_frame_path_to_copy, save_boxed_frames=False, tile_scores=None, tile_threshold=10.0):
+    """Draws green rectangles around areas of significant change. Uses the comparison heatmap when tile_scores is given."""
+    if original_frame is None or (prev_frame_for_diff is None and tile_scores is None): return original_frame
     frame_with_boxes = original_frame.copy()
     try:
-        diff = cv2.absdiff(prev_frame_for_diff, original_frame)
-        gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
-        _, thresh_diff = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
-        dilated_thresh = cv2.dilate(thresh_diff, np.ones((5, 5), np.uint8), iterations=2)
-        contours, _ = cv2.findContours(dilated_thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if tile_scores is not None:
+            boxes = change_boxes_from_tiles(tile_scores, original_frame.shape, tile_threshold, min_contour_area)
+        else:
+            diff = cv2.absdiff(prev_frame_for_diff, original_frame)
+            gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
+            _, thresh_diff = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
+            dilated_thresh = cv2.dilate(thresh_diff, np.ones((5, 5), np.uint8), iterations=2)
+            contours, _ = cv2.findContours(dilated_thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            boxes = [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) > min_contour_area]
         num_boxes_drawn = 0
-        for contour in contours:
-            if cv2.contourArea(contour) > min_contour_area:
-                x, y, w, h = cv2.boundingRect(contour)
-                cv2.rectangle(frame_with_boxes, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                num_boxes_drawn += 1
+        for x, y, w, h in boxes:
+            cv2.rectangle(frame_with_boxes, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            num_boxes_drawn += 1
         if save_boxed_frames and num_boxes_drawn > 0:
-            os.makedirs(output_dir_changes_boxed, exist_ok=True)
+            _ensure_dir(output_dir_changes_boxed)
             viz_save_path = os.path.join(output_dir_changes_boxed, os.path.basename(original_frame_path_to_copy).replace(".jpg", "_viz.jpg"))
             cv2.imwrite(viz_save_path, frame_with_boxes)
             logging.info(f"Saved frame with change boxes: {viz_save_path}")
@@ -439,20 +1212,43 @@ def main():
 
     #Capture & Export Args
     parser.add_argument("--fps_capture", type=int, default=30, help="Desired FPS for camera capture.")
-    parser.add_argument("--video_codec", type=str, default="XVID", help="Codec for raw video output (e.g., XVID, mp4v).")
+    parser.add_argument("--capture_backend", type=str, default="any", choices=sorted(CAPTURE_BACKENDS), help="OpenCV capture API to use.")
+    parser.add_argument("--hw_decode", action="store_true", help="Request hardware-accelerated decoding from the capture backend.")
+    parser.add_argument("--frame_ring_size", type=int, default=3, help="Number of reused capture buffers (min 2).")
+    parser.add_argument("--video_codec", type=str, default="XVID", help="Codec for raw video output (e.g., XVID, mp4v, or FFV1 for lossless).")
+    parser.add_argument("--record_segment_seconds", type=float, default=0, help="Split the raw recording into segments of this length (0 = single file).")
+    parser.add_argument("--record_max_segments", type=int, default=0, help="Keep only the newest N recording segments (0 = keep all).")
+    parser.add_argument("--record_queue_size", type=int, default=256, help="Frames buffered for the background raw-recording encoder.")
     parser.add_argument("--export_format", type=str, default="gif", choices=["gif", "video", "none"], help="Export format for detected changes.")
     parser.add_argument("--gif_frame_duration", type=int, default=200, help="Duration (ms) per frame in exported GIF.")
     parser.add_argument("--video_export_fps", type=int, default=5, help="FPS for exported video of changes.")
+    parser.add_argument("--export_max_frames", type=int, default=0, help="Maximum number of frames in the exported GIF/video; when set, exported frames are spread over --duration (default 0 = every detected change).")
+    parser.add_argument("--export_max_duration", type=float, default=0, help="Maximum playback length (seconds) of the exported GIF/video (0 = unlimited).")
+    parser.add_argument("--detection_log_sink", type=str, default="none", choices=["none", "jsonl", "sqlite"], help="Structured event log written alongside detection_log.csv.")
+    parser.add_argument("--log_flush_interval", type=float, default=2.0, help="Interval (seconds) between detection log flushes.")
 
     #Comparison & Detection Args
     parser.add_argument("--compare_method", type=str, default="pixel_diff", choices=["pixel_diff", "ssim", "background_subtraction"], help="Method for frame comparison.")
     parser.add_argument("--threshold", type=float, default=10.0, help="Difference percentage (0-100) to trigger change detection.")
     parser.add_argument("--draw_change_boxes", action="store_true", default=True, help="Draw boxes on changed frames and save visualizations.")
     parser.add_argument("--min_change_area", type=int, default=100, help="Minimum contour area to be considered a change.")
+    parser.add_argument("--tile_grid", type=str, default="16,9", help="Columns,rows of the per-tile change heatmap.")
+    parser.add_argument("--tile_threshold", type=float, default=0.0, help="Also flag a change when any single tile differs by more than this percentage (0 = off).")
+    parser.add_argument("--ignore_zones", type=str, default=saved_config.get('ignore_zones'),
+                        help="Regions ignored by the comparison, as 'x,y,w,h;x,y,w,h' in ROI coordinates (e.g. clocks, overlays).")
+    parser.add_argument("--reference_screens_dir", type=str, default=saved_config.get('reference_screens_dir'),
+                        help="Directory of known HMI screens (ROI-cropped images named after the screen) to recognise in the live feed.")
+    parser.add_argument("--screen_match_distance", type=int, default=10, help="Maximum perceptual-hash distance (0-64) for a screen match.")
+    parser.add_argument("--screen_stable_frames", type=int, default=3, help="Consecutive frames required before a screen transition is logged.")
+    parser.add_argument("--episode_gap", type=float, default=1.0, help="Seconds without an over-threshold frame that close a change episode.")
+    parser.add_argument("--no-episode-clips", dest="episode_clips", action="store_false", help="Do not write a video clip per change episode.")
+    parser.add_argument("--max_episode_clip_frames", type=int, default=300, help="Maximum number of frames written to each episode clip.")
 
     #Performance & Failure Args
     parser.add_argument("--min_fps_factor", type=float, default=0.70, help="Script fails if measured FPS drops below (desired_fps * this factor).")
     parser.add_argument("--fps_eval_interval", type=int, default=10, help="Interval (seconds) to evaluate FPS.")
+    parser.add_argument("--metrics_interval", type=float, default=10.0, help="Interval (seconds) between performance metric snapshots.")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile dump of the capture session to the output directory.")
 
     #Quality Check Args
     parser.add_argument('--enable-distortion-check', dest='distortion_check', action='store_true', help="Enable checks for edge/bar distortion (default).")
@@ -463,6 +1259,8 @@ def main():
     parser.add_argument("--distortion_solid_area_threshold", type=float, default=0.85, help="Percentage of margin that must be 'black' to flag distortion.")
     parser.add_argument("--distortion_std_dev_thresh", type=int, default=10, help="Max standard deviation for a 'solid' bar.")
     parser.add_argument("--save_tuning_frames", action="store_true", help="Save frames flagged by distortion check for tuning.")
+    parser.add_argument("--distortion_recovery_frames", type=int, default=3, help="Consecutive clean frames required to end a distortion episode.")
+    parser.add_argument("--distortion_max_duration", type=float, default=600, help="Script fails if a single distortion episode lasts longer than this (seconds).")
 
     parser.add_argument("--enable_lighting_check", action="store_true", default=True, help="Enable checks for lighting issues.")
     parser.add_argument("--brightness_dark_thresh", type=int, default=60, help="Mean brightness below this is 'too_dark'.")
@@ -477,6 +1275,7 @@ def main():
     quality_issues_base_dir = os.path.join(args.output_dir, "quality_issues")
     tuning_distortion_output_dir = os.path.join(quality_issues_base_dir, "for_tuning_distortion")
     changes_boxed_output_dir = os.path.join(quality_issues_base_dir, "significant_change_with_boxes")
+    episode_clips_output_dir = os.path.join(args.output_dir, "change_episodes")
 
     #--- Setup Logging ---
     log_file_path = os.path.join(args.output_dir, "camera_tester_activity.log")
@@ -530,20 +1329,20 @@ def main():
     pid_file_path = os.path.join(lock_dir, f"camera_instance_cam{camera_idx_to_use}.pid")
     instance_lock = filelock.FileLock(lock_file_path, timeout=0.1)
 
-    cap, raw_video_writer = None, None
+    cap, raw_video_writer, detection_log, episodes, media_exporter = None, None, None, None, None
+    detected_frames_paths, distortion_monitor, perf, profiler = [], None, None, None
 
     try:
         instance_lock.acquire()
         with open(pid_file_path, "w") as f: f.write(str(os.getpid()))
         logging.info(f"Lock acquired by PID {os.getpid()} for camera index {camera_idx_to_use}.")
 
-        os.makedirs(detected_frames_output_dir, exist_ok=True)
-        csv_file_path = os.path.join(args.output_dir, "detection_log.csv")
-        with open(csv_file_path, mode='w', newline='') as f:
-            csv.writer(f).writerow(["Timestamp", "Session Elapsed (s)", "Difference (%)", "Method", "Saved Frame", "Quality Issues"])
+        _ensure_dir(detected_frames_output_dir)
+        if args.enable_lighting_check: _ensure_dir(quality_issues_base_dir)
+        detection_log = DetectionLogWriter(args.output_dir, args.detection_log_sink, args.log_flush_interval)
 
      #   --- Camera and Video Writer Initialization ---
-        cap = cv2.VideoCapture(camera_idx_to_use)
+        cap = BufferedCapture(camera_idx_to_use, args.capture_backend, args.hw_decode, args.frame_ring_size)
         if not cap.isOpened(): raise RuntimeError(f"Could not open camera index {camera_idx_to_use}.")
 
         cap.set(cv2.CAP_PROP_FPS, args.fps_capture)
@@ -554,8 +1353,10 @@ def main():
 
         logging.info(f"Camera opened: {width}x{height} @ {desired_fps:.2f} FPS (target).")
 
-        raw_video_path = os.path.join(args.output_dir, "full_recorded_video.avi")
-        raw_video_writer = cv2.VideoWriter(raw_video_path, cv2.VideoWriter_fourcc(*args.video_codec), desired_fps, (width, height))
+        raw_video_writer = SegmentedVideoRecorder(args.output_dir, args.video_codec, desired_fps, (width, height),
+                                                  segment_seconds=args.record_segment_seconds,
+                                                  max_segments=args.record_max_segments,
+                                                  queue_size=args.record_queue_size)
 
       #  --- ROI SELECTION LOGIC ---
         roi_coords = None
@@ -606,9 +1407,27 @@ def main():
             logging.error("Cannot run in headless mode without a defined ROI. Please specify --roi or have it in config.json.")
             sys.exit(1)
 
+        try:
+            tile_grid = tuple(map(int, args.tile_grid.split(',')))
+            ignore_zones = [tuple(map(int, z.split(','))) for z in args.ignore_zones.split(';') if z.strip()] if args.ignore_zones else []
+        except ValueError as e:
+            logging.error(f"Invalid --tile_grid or --ignore_zones format. Error: {e}")
+            sys.exit(1)
+        if ignore_zones:
+            logging.info(f"Ignoring {len(ignore_zones)} zone(s) in the comparison: {ignore_zones}")
+
+        screen_index, screen_tracker = None, None
+        if args.reference_screens_dir:
+            if not os.path.isdir(args.reference_screens_dir):
+                logging.error(f"Reference screen directory not found: {args.reference_screens_dir}")
+                sys.exit(1)
+            screen_index = ReferenceScreenIndex.load_or_build(args.reference_screens_dir, args.screen_match_distance)
+            screen_tracker = ScreenTransitionTracker(args.screen_stable_frames)
+
         #--- Main Loop Setup ---
         master_frame = None
-        prev_cropped_frame = None
+        prev_cropped_frame, spare_ref_buf = None, None
+        display_frame_buf = None
 
         if not args.headless:
             window_name = "Camera Feed - Press 'm' to set Master, 'q' to quit"
@@ -627,10 +1446,30 @@ def main():
             back_sub_model = cv2.createBackgroundSubtractorKNN()
             logging.info("Using Background Subtraction method. Allowing model to warm up.")
 
+        perf = PerfTelemetry(os.path.join(args.output_dir, "performance_metrics.jsonl"), desired_fps, args.metrics_interval, {
+            "record_queue": raw_video_writer.qsize,
+            "record_dropped": lambda: raw_video_writer.frames_dropped,
+            "pending_log_rows": detection_log.pending_rows,
+        })
+        if args.profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
         session_start_time = time.time()
         fps_eval_start_time = time.time()
-        fps_eval_frame_count, distortion_strikes = 0, 0
-        detected_frames_paths = []
+        fps_eval_frame_count = 0
+        distortion_monitor = DistortionMonitor(args.distortion_recovery_frames)
+        if args.export_format != "none":
+            export_fps = 1000.0 / args.gif_frame_duration if args.export_format == "gif" else args.video_export_fps
+            export_cap = [c for c in (args.export_max_frames, int(args.export_max_duration * export_fps)) if c > 0]
+            max_export_frames = min(export_cap) if export_cap else 0
+            # Only when a cap was requested: spread the capped frames over the whole session
+            # instead of filling the cap in the first minutes.
+            min_export_interval = args.duration / max_export_frames if args.duration and max_export_frames else 0.0
+            media_exporter = StreamingMediaExporter(args.output_dir, args.export_format, args.gif_frame_duration,
+                                                    args.video_export_fps, max_export_frames, min_export_interval)
+        episodes = ChangeEpisodeTracker(args.episode_gap, episode_clips_output_dir if args.episode_clips else None,
+                                        args.video_export_fps, args.video_codec, args.max_episode_clip_frames)
 
         #--- Main Execution Loop ---
         while True:
@@ -639,16 +1478,18 @@ def main():
                 logging.info(f"Duration of {args.duration}s reached.")
                 break
 
+            perf.begin_frame()
             ret, frame = cap.read()
             if not ret:
                 logging.warning("Could not read frame from camera stream.")
+                perf.count("read_failures")
                 if not cap.isOpened(): break
                 time.sleep(0.5)
                 ret, frame = cap.read()
                 if not ret:
                     raise RuntimeError("Failed to read frame persistently.")
-
-            raw_video_writer.write(frame)
+            frame_time = time.time()
+            perf.lap("capture")
 
          #   --- APPLY ROI CROP TO EVERY FRAME ---
             x, y, w, h = roi_coords
@@ -657,30 +1498,56 @@ def main():
             key = -1
             display_frame = None
             if not args.headless:
-                display_frame = frame.copy()
+                display_frame = display_frame_buf = retain_frame(frame, display_frame_buf)
                 cv2.rectangle(display_frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
                 key = cv2.waitKey(1) & 0xFF
                 if key == ord('q'):
                     logging.info("'q' pressed. Shutting down.")
                     break
+            perf.lap("display")
 
             fps_eval_frame_count += 1
 
           #  --- Run Checks and Comparison on the CROPPED frame ---
+            # Grayscale + integral images computed once per frame and shared by every quality check.
+            quality_stats = FrameQualityStats(cropped_frame, args.distortion_black_threshold) if args.distortion_check else None
             if args.distortion_check:
-                if check_frame_distortion(cropped_frame, args.distortion_black_threshold, args.distortion_edge_margin, args.distortion_solid_area_threshold, args.distortion_std_dev_thresh, tuning_distortion_output_dir, args.save_tuning_frames):
-                    distortion_strikes += 1
-                    time.sleep(60) #add delay for video to stabilize
-                    if distortion_strikes >= 10:
-                        raise RuntimeError("Max distortion strikes reached.")
-                else:
-                    distortion_strikes = 0
+                # Only the first frame of an episode is saved for tuning; the rest would be near-duplicates.
+                frame_distorted = check_frame_distortion(cropped_frame, args.distortion_black_threshold, args.distortion_edge_margin, args.distortion_solid_area_threshold, args.distortion_std_dev_thresh, tuning_distortion_output_dir, args.save_tuning_frames and not distortion_monitor.active, stats=quality_stats)
+                distortion_event = distortion_monitor.update(frame_distorted, elapsed)
+                if distortion_event == "start":
+                    logging.warning("Distortion episode started. Comparison paused until frames are clean again.")
+                    detection_log.log_event("distortion_start", distortion_monitor.episode["start"].strftime('%Y%m%d_%H%M%S_%f')[:-3], elapsed)
+                elif distortion_event == "recovered":
+                    ep = distortion_monitor.episode
+                    duration = ep["end_elapsed"] - ep["start_elapsed"]
+                    logging.info(f"Distortion recovered after {duration:.2f}s ({ep['distorted_frames']} distorted frames).")
+                    detection_log.log_event("distortion_end", ep["end"].strftime('%Y%m%d_%H%M%S_%f')[:-3], ep["end_elapsed"],
+                                            duration_s=round(duration, 3), distorted_frames=ep["distorted_frames"], frames=ep["frames"])
+                if distortion_monitor.active_duration(elapsed) > args.distortion_max_duration:
+                    raise RuntimeError(f"Distortion persisted for more than {args.distortion_max_duration:.0f}s.")
+                if distortion_monitor.active and not args.headless:
+                    draw_ui_text(display_frame, "DISTORTION DETECTED - waiting for clean frames", position=(20, 80), color=(0, 0, 255))
+            perf.lap("quality")
+
+            #--- HMI Screen Recognition ---
+            if screen_index and not distortion_monitor.active:
+                screen_name, screen_distance = screen_index.classify(cropped_frame)
+                transition = screen_tracker.update(screen_name)
+                if transition:
+                    logging.info(f"SCREEN TRANSITION: {transition[0] or 'unknown'} -> {transition[1] or 'unknown'} (distance {screen_distance})")
+                    detection_log.log_event("screen_transition", datetime.fromtimestamp(frame_time).strftime('%Y%m%d_%H%M%S_%f')[:-3], elapsed,
+                                            from_screen=transition[0], to_screen=transition[1], distance=screen_distance)
+                if not args.headless:
+                    draw_ui_text(display_frame, f"SCREEN: {screen_tracker.current or 'unknown'}", position=(20, 120))
+                perf.lap("screen")
 
            # --- Main Comparison Logic ---
             diff_percent = 0.0
+            comparison_ref_frame, tile_scores = None, None
             if args.master_frame_mode:
                 if not args.headless and key == ord('m'):
-                    master_frame = cropped_frame.copy()
+                    master_frame = retain_frame(cropped_frame)
                     master_frame_path = os.path.join(args.output_dir, "current_master_frame.jpg")
                     cv2.imwrite(master_frame_path, master_frame)
                     logging.info("="*50)
@@ -690,7 +1557,9 @@ def main():
 
                 if master_frame is not None:
                     if not args.headless: draw_ui_text(display_frame, "STATUS: Master Frame is SET. Press 'm' to update.")
-                    diff_percent = run_comparison_method(args.compare_method, cropped_frame, master_frame)
+                    if not distortion_monitor.active:
+                        diff_percent, tile_scores = compare_frames(args.compare_method, cropped_frame, master_frame, back_sub_model, tile_grid, ignore_zones)
+                        comparison_ref_frame = master_frame
                 elif not args.headless:
                     draw_ui_text(display_frame, "STATUS: Waiting for Master Frame. Press 'm' to set.")
             else: #Frame-to-frame mode
@@ -698,54 +1567,48 @@ def main():
                     logging.warning("Key 'm' pressed, but script is not in master frame mode.")
                     logging.warning("To enable this feature, please run the script with the '--master_frame_mode' flag.")
 
-                if prev_cropped_frame is not None:
-                    diff_percent = run_comparison_method(args.compare_method, cropped_frame, prev_cropped_frame)
-                prev_cropped_frame = cropped_frame.copy()
-
-            #--- Difference Detection and Artifact Generation ---
-            if diff_percent > args.threshold:
-                timestamp = datetime.now()
-                ts_str = timestamp.strftime('%Y%m%d_%H%M%S_%f')[:-3]
-                filename = f"change_{ts_str}.jpg"
-                save_path = os.path.join(detected_frames_output_dir, filename)
-
-                cv2.imwrite(save_path, frame) #Save the original, full-size frame for context
-                detected_frames_paths.append(save_path)
-                log_msg_source = "vs MASTER" if args.master_frame_mode and master_frame is not None else "vs PREVIOUS"
-                logging.info(f"CHANGE DETECTED ({diff_percent:.2f}% {log_msg_source}): Saved FULL frame {filename}")
-
-             #   Create and save the side-by-side comparison image
-                comparison_ref_frame = master_frame if args.master_frame_mode and master_frame is not None else prev_cropped_frame
-                if comparison_ref_frame is not None:
-                    comparison_image = create_side_by_side_comparison(comparison_ref_frame, cropped_frame, diff_percent)
-                    comparison_filename = f"change_{ts_str}_comparison.jpg"
-                    comparison_save_path = os.path.join(detected_frames_output_dir, comparison_filename)
-                    cv2.imwrite(comparison_save_path, comparison_image)
-                    logging.info(f"Saved side-by-side comparison image: {comparison_filename}")
-
-              #  Run Quality Checks
-                quality_issues = []
-                if args.enable_lighting_check:
-                    os.makedirs(quality_issues_base_dir, exist_ok=True)
-                    quality_issues = check_lighting_and_color(cropped_frame, args.brightness_dark_thresh, args.brightness_bright_thresh, args.black_screen_std_dev_thresh, quality_issues_base_dir, save_path, True)
-
-                if args.draw_change_boxes:
-                    draw_change_rectangles(cropped_frame, comparison_ref_frame, args.min_change_area, changes_boxed_output_dir, save_path, True)
-
-                #Log to CSV
-                with open(csv_file_path, 'a', newline='') as f:
-                    csv.writer(f).writerow([ts_str, f"{elapsed:.2f}", f"{diff_percent:.2f}", args.compare_method, save_path, ", ".join(quality_issues) or "None"])
+                # Distorted frames are discarded so the first clean frame is compared to the last clean one.
+                if not distortion_monitor.active:
+                    if prev_cropped_frame is not None:
+                        diff_percent, tile_scores = compare_frames(args.compare_method, cropped_frame, prev_cropped_frame, back_sub_model, tile_grid, ignore_zones)
+                        comparison_ref_frame = prev_cropped_frame
+                    # The capture ring recycles cropped_frame's buffer, so the reference is copied into one of two
+                    # swapped buffers; comparison_ref_frame stays intact until the end of this iteration.
+                    prev_cropped_frame, spare_ref_buf = retain_frame(cropped_frame, spare_ref_buf), prev_cropped_frame
+
+            perf.lap("compare")
+            # Recorded after the comparison so the frame index carries this frame's diff score.
+            raw_video_writer.write(frame, frame_time, elapsed, diff_percent if comparison_ref_frame is not None else None)
+            perf.lap("record")
+
+            #--- Difference Detection and Episode Clustering ---
+            closed_episode = episodes.poll()
+            if closed_episode:
+                detected_frames_paths.append(save_change_episode(closed_episode, args, detected_frames_output_dir, quality_issues_base_dir, changes_boxed_output_dir, detection_log, media_exporter))
+
+            tile_change = args.tile_threshold and tile_scores is not None and tile_scores.max() > args.tile_threshold
+            if diff_percent > args.threshold or tile_change:
+                if episodes.current is None:
+                    log_msg_source = "vs MASTER" if args.master_frame_mode and master_frame is not None else "vs PREVIOUS"
+                    logging.info(f"CHANGE DETECTED ({diff_percent:.2f}% {log_msg_source}): Change episode started.")
+                episodes.update(datetime.now(), elapsed, diff_percent, frame, cropped_frame, comparison_ref_frame, quality_stats, tile_scores)
 
                # Check if the script should exit on this difference
                 if args.exit_on_first_diff:
                     logging.info("--exit-on-first-diff flag is set. Shutting down after first detected change.")
                     break #Exit the while loop gracefully
+            perf.lap("episodes")
 
             if not args.headless:
                 # Define a fixed size for the display window and resize the frame
                 fixed_display_size = (960, 540) # Width, Height
                 display_frame = cv2.resize(display_frame, fixed_display_size, interpolation=cv2.INTER_AREA)
                 cv2.imshow(window_name, display_frame)
+                perf.lap("display")
+
+            detection_log.maybe_flush()
+            perf.lap("log")
+            perf.end_frame()
 
             #--- FPS Evaluation ---
             eval_interval = time.time() - fps_eval_start_time
@@ -769,11 +1632,31 @@ def main():
             cv2.destroyAllWindows()
         if cap and cap.isOpened(): cap.release()
         if raw_video_writer: raw_video_writer.release()
-        logging.info("Camera and video writer released.")
-
-        if args.export_format != "none" and detected_frames_paths:
-            logging.info(f"Exporting {len(detected_frames_paths)} frames as {args.export_format}...")
-            export_media(detected_frames_paths, args.output_dir, args.export_format, args.gif_frame_duration, args.video_export_fps)
+        open_episode = episodes.close() if episodes else None
+        if open_episode:
+            try:
+                detected_frames_paths.append(save_change_episode(open_episode, args, detected_frames_output_dir, quality_issues_base_dir, changes_boxed_output_dir, detection_log, media_exporter))
+            except Exception as e:
+                logging.error(f"Could not save final change episode: {e}")
+        if distortion_monitor and distortion_monitor.active and detection_log:
+            ep = distortion_monitor.episode
+            logging.warning(f"Session ended during a distortion episode ({ep['distorted_frames']} distorted frames).")
+            detection_log.log_event("distortion_unrecovered", ep["start"].strftime('%Y%m%d_%H%M%S_%f')[:-3], ep["start_elapsed"],
+                                    distorted_frames=ep["distorted_frames"], frames=ep["frames"])
+        if detection_log: detection_log.close()
+        logging.info("Camera, video writer and detection log released.")
+
+        if media_exporter:
+            logging.info(f"Finalising {args.export_format} export of {len(detected_frames_paths)} detected changes...")
+            media_exporter.close()
+
+        if profiler:
+            profiler.disable()
+            profile_path = os.path.join(args.output_dir, "session_profile.prof")
+            profiler.dump_stats(profile_path)
+            logging.info(f"cProfile dump written to {profile_path} (inspect with: python -m pstats {profile_path})")
+        if perf:
+            perf.summary()
 
         if instance_lock.is_locked:
             instance_lock.release()
@@ -37,7 +37,12 @@ Exit codes
 Usage
 -----
     python simulate_tests.py [--root <STLA_SWTest folder>]
-                             [--out-dir <output directory>]
+                             [--out-dir <output directory>] [--no-cache]
+                             [--jobs N]
+
+The .run cache is walked once per run; directory listings are remembered
+in <root>/.vtt_export_index.json (keyed by directory mtime) so unchanged
+hash folders are not listed again on the next run.
 
 This script is stdlib-only and runs on Linux (GitHub Actions ubuntu-latest)
 as well as Windows (Jenkins windows-agent).  It has NO dependency on any
@@ -48,9 +53,11 @@ from __future__ import annotations
 
 import argparse
 import datetime
+import json
 import os
 import sys
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -116,16 +123,97 @@ def _find_run_dir(stla_root: Path) -> Optional[Path]:
     return candidate if candidate.is_dir() else None
 
 
-def _latest_export_xml(run_dir: Path, filename: str) -> Optional[Path]:
+EXPORT_SUFFIX = '.vtt.export.xml'
+EXPORT_INDEX_FILENAME = '.vtt_export_index.json'
+EXPORT_INDEX_VERSION = 1
+
+
+def _read_export_index(index_path: Optional[Path], run_dir: Path) -> Dict[str, Dict]:
+    if index_path is None:
+        return {}
+    try:
+        data = json.loads(index_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != EXPORT_INDEX_VERSION or data.get('run_dir') != str(run_dir):
+        return {}
+    return data.get('dirs', {})
+
+
+def _write_export_index(index_path: Path, run_dir: Path, dirs: Dict[str, Dict]) -> None:
+    data = {'version': EXPORT_INDEX_VERSION, 'run_dir': str(run_dir), 'dirs': dirs}
+    tmp = index_path.with_name(index_path.name + '.tmp')
+    try:
+        tmp.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp, index_path)
+    except OSError as exc:
+        print(f"  WARNING: could not write export index {index_path}: {exc}", file=sys.stderr)
+
+
+def _latest_export_xmls(run_dir: Path, index_path: Optional[Path] = None) -> Dict[str, Path]:
     """
-    Return the most recently modified copy of *filename* anywhere under
-    *run_dir*, or None if none is found.  CANoe stores multiple versioned
-    copies in hash-named subdirectories; the newest is authoritative.
+    Return {file name: newest copy} for every *.vtt.export.xml anywhere under
+    *run_dir*.  CANoe stores multiple versioned copies in hash-named
+    subdirectories; the most recently modified one is authoritative (on an
+    mtime tie the first one in walk order wins, as rglob() + max() did).
+
+    The .run cache is walked once for all suites.  With *index_path* the
+    listing of every directory is persisted together with its mtime, so on
+    the next run a directory whose mtime has not changed is not listed
+    again – only its known export files are re-stat'ed (to catch in-place
+    rewrites) and its known subdirectories visited.  File names are
+    compared with os.path.normcase, like rglob() on the host OS.
     """
-    candidates = list(run_dir.rglob(filename))
-    if not candidates:
-        return None
-    return max(candidates, key=lambda p: p.stat().st_mtime)
+    cached = _read_export_index(index_path, run_dir)
+    dirs: Dict[str, Dict] = {}
+    newest: Dict[str, Tuple[int, Path]] = {}
+    stack = ['']                       # run_dir-relative directories, pre-order
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(run_dir, rel) if rel else str(run_dir)
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        entry = cached.get(rel)
+        if entry is not None and entry['mtime_ns'] == dir_mtime:
+            exports = {}
+            for name in entry['exports']:
+                try:
+                    exports[name] = os.stat(os.path.join(path, name)).st_mtime_ns
+                except OSError:
+                    continue
+            subdirs = entry['subdirs']
+        else:
+            exports, subdirs = {}, []
+            try:
+                with os.scandir(path) as it:
+                    for item in it:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                subdirs.append(item.name)
+                            elif item.name.endswith(EXPORT_SUFFIX):
+                                exports[item.name] = item.stat().st_mtime_ns
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        dirs[rel] = {'mtime_ns': dir_mtime, 'subdirs': subdirs, 'exports': exports}
+
+        for name, mtime in exports.items():
+            key = os.path.normcase(name)
+            if key not in newest or mtime > newest[key][0]:
+                newest[key] = (mtime, Path(path, name))
+        stack.extend(os.path.join(rel, d) if rel else d for d in reversed(subdirs))
+
+    if index_path is not None:
+        _write_export_index(index_path, run_dir, dirs)
+    return {key: found for key, (_, found) in newest.items()}
+
+
+def _latest_export_xml(exports: Dict[str, Path], filename: str) -> Optional[Path]:
+    """Newest copy of *filename* in a _latest_export_xmls() map, or None."""
+    return exports.get(os.path.normcase(filename))
 
 
 # ---------------------------------------------------------------------------
@@ -136,23 +224,42 @@ def extract_test_sequences(export_xml: Path) -> List[str]:
     """
     Parse a .vtt.export.xml file and return a deduplicated, ordered list of
     top-level <testsequence name="..."> values.
+
+    The export is streamed with iterparse(): names are taken from the
+    <testsequence> start events and every element is cleared once it ends,
+    so the test-step definitions are never held in memory as a tree.
     """
+    seen: List[str] = []
+    visited: set = set()
+    root = None
+    depth = 0
     try:
-        tree = ET.parse(export_xml)
+        for event, elem in ET.iterparse(export_xml, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                if elem.tag == 'testsequence':
+                    name = elem.get('name', '').strip()
+                    if name and name not in visited:
+                        seen.append(name)
+                        visited.add(name)
+                continue
+            depth -= 1
+            elem.clear()
+            if depth == 1:
+                root.clear()           # drop the emptied top-level children too
     except ET.ParseError as exc:
         print(f"  WARNING: could not parse {export_xml}: {exc}", file=sys.stderr)
         return []
-
-    seen: List[str] = []
-    visited: set = set()
-    for elem in tree.getroot().iter('testsequence'):
-        name = elem.get('name', '').strip()
-        if name and name not in visited:
-            seen.append(name)
-            visited.add(name)
     return seen
 
 
+def _extract_worker(export_xml: str) -> List[str]:
+    """ProcessPoolExecutor entry point for extract_test_sequences()."""
+    return extract_test_sequences(Path(export_xml))
+
+
 # ---------------------------------------------------------------------------
 # JUnit XML writer
 # ---------------------------------------------------------------------------
@@ -326,6 +433,20 @@ def main() -> int:
             "Default: <root>/Test Reports/simulation"
         ),
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=(
+            f"Walk the whole .run cache; do not read or write <root>/{EXPORT_INDEX_FILENAME}"
+        ),
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=("Number of worker processes for parsing the export files (0 = one per CPU, default: 1). "
+              "Only pays off for large exports; process start-up dominates for small ones"),
+    )
     args = parser.parse_args()
     root: Path = args.root.resolve()
 
@@ -366,18 +487,28 @@ def main() -> int:
     results: List[Dict] = []
     total_found = 0
 
-    for suite in KNOWN_SUITES:
+    # One walk of the .run cache serves every suite
+    exports: Dict[str, Path] = {}
+    if run_dir:
+        exports = _latest_export_xmls(run_dir, None if args.no_cache else root / EXPORT_INDEX_FILENAME)
+
+    # Parse the export of every suite up front, in parallel with --jobs
+    export_paths: List[Optional[Path]] = [
+        _latest_export_xml(exports, suite['vtt']) for suite in KNOWN_SUITES
+    ]
+    pending = [str(p) for p in export_paths if p]
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            parsed = iter(list(pool.map(_extract_worker, pending)))
+    else:
+        parsed = iter([_extract_worker(p) for p in pending])
+
+    for suite, export_path in zip(KNOWN_SUITES, export_paths):
         suite_name  = suite['name']
-        vtt_file    = suite['vtt']
         label       = suite['label']
 
-        sequences: List[str] = []
-        export_path: Optional[Path] = None
-
-        if run_dir:
-            export_path = _latest_export_xml(run_dir, vtt_file)
-            if export_path:
-                sequences = extract_test_sequences(export_path)
+        sequences: List[str] = next(parsed) if export_path else []
 
         count  = len(sequences)
         status = f"{count} sequences" if count > 0 else "no export found"